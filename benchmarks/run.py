@@ -0,0 +1,247 @@
+"""
+Throughput benchmarks for lppls.
+
+Run from the repository root:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --length 1000 --workers 1 2 4 8 --save bench.json
+    python -m benchmarks.run --compare bench.json --tolerance 0.2
+
+The nb_compute_nested_fits cases use --workers as thread counts, up to numba's NUMBA_NUM_THREADS.
+
+Every case reports fits (or calls) per second, objective evaluations per fit where they can be counted and the
+peak memory allocated by one extra call run with tracemalloc on, outside the timed calls. With --compare the run
+exits with status 1 when a case is slower than the saved baseline by more than --tolerance, so it can gate
+dependency upgrades.
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numba
+import numpy as np
+
+from lppls import data_loader, lppls, lppls_cmaes, lppls_lm, lppls_q
+
+
+def nasdaq_observations():
+    data = data_loader.nasdaq_dotcom()
+    return np.array([np.arange(len(data), dtype=np.float64), np.log(data["Adj Close"].values)])
+
+
+def synthetic_observations(length, seed=0):
+    """
+    Log prices following an LPPLS bubble with critical time just after the last observation, plus noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(length, dtype=np.float64)
+    tc = length * 1.05
+    p = lppls.LPPLS.lppls(t, tc, 0.5, 8.0, 7.0, -0.02 * length ** 0.5, 0.002 * length ** 0.5, 0.001 * length ** 0.5)
+    return np.array([t, p + rng.normal(0, 0.01, length)])
+
+
+class EvalCounter(object):
+    """
+    Calls a fit with a stats dict and accumulates the objective evaluations it reports.
+    """
+
+    def __init__(self, fit, **kwargs):
+        self.n = 0
+        self.fit = fit
+        self.kwargs = kwargs
+
+    def __call__(self):
+        stats = {}
+        self.fit(stats=stats, **self.kwargs)
+        self.n += stats["nfev"]
+
+
+class NestedEvalCounter(object):
+    """
+    Calls a nested fit sweep and accumulates the objective evaluations recorded in its result.
+    """
+
+    def __init__(self, sweep, *args, **kwargs):
+        self.n = 0
+        self.sweep = sweep
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        self.n += int(self.sweep(*self.args, **self.kwargs)["nfev"].sum())
+
+
+def measure(func, repeat, min_time):
+    """
+    Calls func once to warm up, then timed until it ran at least `repeat` times and for at least `min_time`
+    seconds, then once more with tracemalloc on, which slows down every allocation and so is kept out of the
+    timed calls.
+    Returns:
+        seconds per call, number of timed calls, peak traced memory in bytes
+    """
+    func()  # compile / warm caches
+    n = 0
+    start = time.perf_counter()
+    while n < repeat or time.perf_counter() - start < min_time:
+        func()
+        n += 1
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed / n, n, peak
+
+
+def fit_cases(obs, max_searches, minimizers):
+    window = obs[:, -min(obs.shape[1], 120):]
+    cases = []
+
+    base = lppls.LPPLS(window)
+    t, m, w = window[0, -1] + 5, 0.5, 9.0
+    cases.append(("matrix_equation", lambda: base.matrix_equation(window, t, m, w), None, 1))
+    cases.append(("func_restricted", lambda: base.func_restricted(np.array([t, m, w]), window), None, 1))
+
+    models = [
+        ("LPPLS", lppls.LPPLS(window), minimizers),
+        ("LPPLS_LM", lppls_lm.LPPLS_LM(window), ["lm"]),
+        ("QLPPLS", lppls_q.QLPPLS(window, q=0.5), [mz for mz in minimizers if mz in ("Nelder-Mead", "numba")]),
+    ]
+    for name, model, model_minimizers in models:
+        for minimizer in model_minimizers:
+            counter = EvalCounter(model.fit, max_searches=max_searches, minimizer=minimizer)
+            cases.append((f"fit[{name}, {minimizer}]", counter, counter, 1))
+
+    counter = EvalCounter(lppls_cmaes.LPPLSCMAES(window).fit, max_iteration=100, pop_size=1)
+    cases.append(("fit[LPPLSCMAES]", counter, counter, 1))
+    return cases
+
+
+def nested_cases(obs, args):
+    model = lppls.LPPLS(obs)
+    nested = dict(
+        window_size=args.window_size,
+        smallest_window_size=args.smallest_window_size,
+        outer_increment=args.outer_increment,
+        inner_increment=args.inner_increment,
+        max_searches=args.max_searches,
+        minimizer=args.nested_minimizer,
+    )
+    n_windows = len(range(0, obs.shape[1] - args.window_size + 1, args.outer_increment))
+    n_fits = n_windows * len(range(0, args.window_size - args.smallest_window_size, args.inner_increment))
+
+    counter = NestedEvalCounter(model.compute_nested_fits, as_array=True, **nested)
+    cases = [("compute_nested_fits", counter, counter, n_fits)]
+    for workers in args.workers:
+        counter = NestedEvalCounter(model.mp_compute_nested_fits, workers, as_array=True, **nested)
+        cases.append((f"mp_compute_nested_fits[workers={workers}]", counter, counter, n_fits))
+    compiled = {k: v for k, v in nested.items() if k != "minimizer"}
+    for threads in args.workers:
+        if threads <= numba.config.NUMBA_NUM_THREADS:
+            counter = NestedEvalCounter(model.nb_compute_nested_fits, threads=threads, **compiled)
+            cases.append((f"nb_compute_nested_fits[threads={threads}]", counter, counter, n_fits))
+    res = model.compute_nested_fits(as_array=True, **nested)
+    cases.append(("compute_indicators", lambda: model.compute_indicators(res), None, n_fits))
+    return cases
+
+
+def run(args):
+    results = {}
+    datasets = [("nasdaq", nasdaq_observations())]
+    datasets += [(f"synthetic{n}", synthetic_observations(n)) for n in args.length]
+
+    for data_name, obs in datasets:
+        cases = fit_cases(obs, args.max_searches, args.minimizers)
+        if not args.skip_nested:
+            cases += nested_cases(obs, args)
+        for case_name, func, counter, fits_per_call in cases:
+            if args.only and not any(s in case_name for s in args.only):
+                continue
+            if counter is not None:
+                counter.n = 0
+            seconds, calls, peak = measure(func, args.repeat, args.min_time)
+            evals = np.nan if counter is None else counter.n / (calls + 2)  # plus the warm-up and traced calls
+            key = f"{data_name}:{case_name}"
+            results[key] = {
+                "fits_per_sec": fits_per_call / seconds,
+                "evals_per_fit": evals / fits_per_call,
+                "peak_mem_mb": peak / 2 ** 20,
+                "calls": calls,
+            }
+            print(
+                f"{key:<55} {results[key]['fits_per_sec']:>12.1f}/s {results[key]['evals_per_fit']:>10.1f} evals"
+                f" {results[key]['peak_mem_mb']:>9.2f} MB",
+                flush=True,
+            )
+
+    children_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 2 ** 10
+    print(f"peak RSS of worker processes: {children_mb:.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list of (case, baseline fits/sec, current fits/sec) for the cases slower than the baseline by more than tolerance
+    """
+    regressions = []
+    for key, base in baseline["results"].items():
+        if key in results and results[key]["fits_per_sec"] < base["fits_per_sec"] * (1 - tolerance):
+            regressions.append((key, base["fits_per_sec"], results[key]["fits_per_sec"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--length", type=int, nargs="*", default=[500], help="lengths of the synthetic series")
+    parser.add_argument("--max-searches", type=int, default=25)
+    parser.add_argument("--minimizers", nargs="+", default=["Nelder-Mead", "numba", "L-BFGS-B"])
+    parser.add_argument("--window-size", type=int, default=80)
+    parser.add_argument("--smallest-window-size", type=int, default=20)
+    parser.add_argument("--outer-increment", type=int, default=20)
+    parser.add_argument("--inner-increment", type=int, default=5)
+    parser.add_argument("--nested-minimizer", default="numba")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--skip-nested", action="store_true", help="only run the single fit cases")
+    parser.add_argument("--only", nargs="*", help="run only the cases whose name contains one of these strings")
+    parser.add_argument("--repeat", type=int, default=3, help="minimum number of timed calls per case")
+    parser.add_argument("--min-time", type=float, default=1.0, help="minimum seconds spent timing each case")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative drop in fits/sec")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(
+                {
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                    "numpy": np.__version__,
+                    "args": vars(args),
+                    "results": results,
+                },
+                fh,
+                indent=2,
+            )
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: {before:.1f}/s -> {after:.1f}/s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
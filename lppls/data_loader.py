@@ -1,17 +1,116 @@
-import pkg_resources
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import os
+import numpy as np
 import pandas as pd
 
+# the bundled csv files ship next to this module (the package is installed with zip_safe=False), so they are
+# read from the file system directly instead of importing pkg_resources, which is slow to import
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# proleptic Gregorian ordinal (the time axis of the examples) of the numpy/pandas epoch 1970-01-01
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# file types read by load_histories, by extension
+HISTORY_FORMATS = ('.csv', '.parquet', '.npy')
+
 
 # def sp500():
-#     # This is a stream-like object. If you want the actual info, call
-#     # stream.read()
-#     stream = pkg_resources.resource_stream(__name__, 'data/sp500.csv')
-#     return pd.read_csv(stream, encoding='utf-8')
+#     return pd.read_csv(os.path.join(DATA_DIR, 'sp500.csv'), encoding='utf-8')
 
 
 def nasdaq_dotcom():
-    # This is a stream-like object. If you want the actual info, call
-    # stream.read()
-    stream = pkg_resources.resource_stream(__name__, 'data/nasdaq_dotcom.csv')
-    return pd.read_csv(stream, encoding='utf-8')
+    return pd.read_csv(os.path.join(DATA_DIR, 'nasdaq_dotcom.csv'), encoding='utf-8')
+
+
+def to_ordinal(dates):
+    """
+    Vectorized pd.Timestamp.toordinal, the time axis used in the examples. Time zone aware dates count by
+    their local calendar date, like Timestamp.toordinal, not by their UTC date.
+    Args:
+        dates (array-like): dates, date strings or a DatetimeIndex.
+    Returns:
+        np.ndarray of float64 ordinals
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    return (days + EPOCH_ORDINAL).astype(np.float64)
+
+
+def to_observations(data, date_col='Date', price_col='Adj Close', log=True):
+    """
+    Args:
+        data (pd.DataFrame): one row per observation, e.g. the result of nasdaq_dotcom.
+        date_col (str): column of dates or date strings.
+        price_col (str): column of prices.
+        log (bool): take the log of the prices.
+    Returns:
+        2xM np.ndarray of float64 (ordinal time, price), the observations expected by LPPLS
+    """
+    obs = np.empty((2, len(data)), dtype=np.float64)
+    obs[0] = to_ordinal(data[date_col])
+    obs[1] = data[price_col].to_numpy(dtype=np.float64)
+    if log:
+        np.log(obs[1], out=obs[1])
+    return obs
+
+
+def load_history(path, date_col='Date', price_col='Adj Close', log=True):
+    """
+    Reads the observations of one symbol. CSV and Parquet files are read with only the date and price columns
+    and converted with to_observations; .npy files must already hold a 2xM float64 observations array and are
+    memory-mapped read-only instead of read, so they cost no copy until the values are touched.
+    Args:
+        path (str): .csv, .parquet (needs pyarrow) or .npy file.
+        date_col, price_col, log: see to_observations, unused for .npy files.
+    Returns:
+        2xM np.ndarray (np.memmap for .npy files)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    assert ext in HISTORY_FORMATS, f"Expected one of {HISTORY_FORMATS}, got :{path}"
+    if ext == '.npy':
+        obs = np.load(path, mmap_mode='r')
+        assert obs.ndim == 2 and obs.shape[0] == 2, f"Expected a 2xM observations array, got shape :{obs.shape}"
+        return obs
+    if ext == '.parquet':
+        data = pd.read_parquet(path, columns=[date_col, price_col])
+    else:
+        data = pd.read_csv(path, usecols=[date_col, price_col])
+    return to_observations(data, date_col, price_col, log)
+
+
+def load_histories(path, date_col='Date', price_col='Adj Close', log=True, workers=8):
+    """
+    Reads every .csv, .parquet and .npy file of a directory as the history of one symbol named after the file,
+    in a thread pool. The result can be passed to lppls_panel.LPPLSPanel as is.
+    Args:
+        path (str): directory of history files.
+        date_col, price_col, log: see load_history.
+        workers (int): number of files read at once.
+    Returns:
+        dict mapping each symbol to its 2xM observations, sorted by symbol
+    """
+    files = sorted(f for f in os.listdir(path) if os.path.splitext(f)[1].lower() in HISTORY_FORMATS)
+    symbols = [os.path.splitext(f)[0] for f in files]
+    assert len(set(symbols)) == len(symbols), "Expected one history file per symbol"
+
+    def read(f):
+        return load_history(os.path.join(path, f), date_col, price_col, log)
+
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        return dict(zip(symbols, executor.map(read, files)))
+
 
+def save_histories(path, histories):
+    """
+    Writes each symbol's observations to `path`/<symbol>.npy, which load_histories memory-maps, so that
+    histories converted once from CSV or Parquet load without parsing afterwards.
+    Args:
+        path (str): directory, created if it does not exist.
+        histories (dict): symbol to 2xM observations, e.g. the result of load_histories.
+    """
+    os.makedirs(path, exist_ok=True)
+    for symbol, obs in histories.items():
+        np.save(os.path.join(path, f'{symbol}.npy'), np.asarray(obs, dtype=np.float64))
@@ -0,0 +1,64 @@
+import io
+import sqlite3
+import numpy as np
+
+
+class FitCache(object):
+
+    def __init__(self, path):
+        """
+        Persistent store of nested fit results in a local SQLite file, used through the `cache` argument
+        of LPPLS.mp_compute_nested_fits and LPPLS.compute_nested_fits. Keys are produced by LPPLS from a
+        hash of the window's observations and the fit configuration, values are the structured arrays
+        of nested fits of one outer window.
+        Args:
+            path (str): location of the SQLite file, created if it does not exist. Use ":memory:" for a
+                cache that lives only as long as this object.
+        """
+        self.path = path
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS fits (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        return self._conn
+
+    def get(self, key):
+        """
+        Returns:
+            the cached np.ndarray or None
+        """
+        row = self.conn.execute("SELECT value FROM fits WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return np.load(io.BytesIO(row[0]), allow_pickle=False)
+
+    def put(self, key, value):
+        """
+        Args:
+            key (str): cache key.
+            value (np.ndarray): array to store, structured dtypes included.
+        """
+        buf = io.BytesIO()
+        np.save(buf, value, allow_pickle=False)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO fits (key, value) VALUES (?, ?)", (key, buf.getvalue()))
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM fits WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM fits").fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __getstate__(self):
+        # connections cannot cross process boundaries; each process reopens the file lazily
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
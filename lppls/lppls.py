@@ -1,14 +1,752 @@
-from multiprocessing import Pool
-from matplotlib import pyplot as plt
-from numba import njit
+from concurrent.futures import as_completed
+import contextlib
+import copy
+import functools
+import hashlib
+from multiprocessing import Pool, shared_memory
+from numba import config as numba_config, get_num_threads, njit, prange, set_num_threads, threading_layer
 import numpy as np
 import pandas as pd
+import os
 import random
+import time
 from datetime import datetime as date
 from pandas._libs.tslibs.np_datetime import OutOfBoundsDatetime
-from scipy.optimize import minimize
-from tqdm import tqdm
-import xarray as xr
+
+try:
+    from lppls.data_loader import EPOCH_ORDINAL
+except ImportError:  # lppls.py imported as the top-level module lppls, as in the tests
+    from data_loader import EPOCH_ORDINAL
+
+
+@contextlib.contextmanager
+def _fork_safe_threading_layer():
+    """
+    With tbb as numba's threading layer, a process that runs a parallel kernel and then forks a worker pool (as the
+    nested fit sweeps do) hangs on exit. While this context is entered, numba prefers the fork-safe workqueue layer
+    if it has not started its threads yet and neither NUMBA_THREADING_LAYER nor NUMBA_THREADING_LAYER_PRIORITY is
+    set. numba keeps the layer its threads started with for the rest of the process.
+    """
+    try:
+        threading_layer()
+        configured = True
+    except ValueError:
+        # numba's threads have not been started yet
+        configured = numba_config.THREADING_LAYER != "default" or "NUMBA_THREADING_LAYER_PRIORITY" in os.environ
+    if configured:
+        yield
+        return
+    priority = numba_config.THREADING_LAYER_PRIORITY
+    numba_config.THREADING_LAYER_PRIORITY = ["workqueue", "omp", "tbb"]
+    try:
+        yield
+    finally:
+        numba_config.THREADING_LAYER_PRIORITY = priority
+
+
+@njit(nogil=True, cache=True)
+def _solve_linear_params(t, p, tc, m, w):
+    """
+    Compiled counterpart of LPPLS.matrix_equation. Solves the 4x4 normal equations with
+    partially pivoted Gaussian elimination so that a singular or non-finite system is
+    reported through the `ok` flag instead of raising inside a compiled loop.
+    Returns:
+        ok, a, b, c1, c2
+    """
+    A = np.zeros((4, 4))
+    r = np.zeros(4)
+    A[0, 0] = len(t)
+    for i in range(len(t)):
+        dt = np.abs(tc - t[i]) + 1e-8
+        phase = w * np.log(dt)
+        fi = dt ** m
+        gi = fi * np.cos(phase)
+        hi = fi * np.sin(phase)
+        A[0, 1] += fi
+        A[0, 2] += gi
+        A[0, 3] += hi
+        A[1, 1] += fi * fi
+        A[1, 2] += fi * gi
+        A[1, 3] += fi * hi
+        A[2, 2] += gi * gi
+        A[2, 3] += gi * hi
+        A[3, 3] += hi * hi
+        r[0] += p[i]
+        r[1] += p[i] * fi
+        r[2] += p[i] * gi
+        r[3] += p[i] * hi
+    for i in range(4):
+        A[i, i] += 1e-8
+        for j in range(i):
+            A[i, j] = A[j, i]
+    return _solve_4x4(A, r)
+
+
+@njit(nogil=True, cache=True)
+def _solve_4x4(A, r):
+    for k in range(4):
+        piv = k
+        for i in range(k + 1, 4):
+            if np.abs(A[i, k]) > np.abs(A[piv, k]):
+                piv = i
+        if not np.isfinite(A[piv, k]) or A[piv, k] == 0.0:
+            return False, 0.0, 0.0, 0.0, 0.0
+        if piv != k:
+            for j in range(4):
+                tmp = A[k, j]
+                A[k, j] = A[piv, j]
+                A[piv, j] = tmp
+            tmp = r[k]
+            r[k] = r[piv]
+            r[piv] = tmp
+        for i in range(k + 1, 4):
+            f = A[i, k] / A[k, k]
+            for j in range(k, 4):
+                A[i, j] -= f * A[k, j]
+            r[i] -= f * r[k]
+    x = np.zeros(4)
+    for k in range(3, -1, -1):
+        s = r[k]
+        for j in range(k + 1, 4):
+            s -= A[k, j] * x[j]
+        x[k] = s / A[k, k]
+    ok = np.isfinite(x[0]) and np.isfinite(x[1]) and np.isfinite(x[2]) and np.isfinite(x[3])
+    return ok, x[0], x[1], x[2], x[3]
+
+
+@njit(nogil=True, cache=True)
+def _profile_cost(t, p, tc, m, w):
+    """
+    Sum of squared residuals of the LPPLS model with the linear params profiled out,
+    i.e. the compiled equivalent of LPPLS.func_restricted. Returns inf when the linear
+    system cannot be solved so that the optimizer simply moves away from that point.
+    """
+    ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+    if not ok:
+        return np.inf
+    sse = 0.0
+    for i in range(len(t)):
+        dt = np.abs(tc - t[i]) + 1e-8
+        phase = w * np.log(dt)
+        e = a + dt ** m * (b + c1 * np.cos(phase) + c2 * np.sin(phase)) - p[i]
+        sse += e * e
+    if not np.isfinite(sse):
+        return np.inf
+    return sse
+
+
+@njit(nogil=True, cache=True)
+def _quantile_cost(t, p, tc, m, w, q):
+    """
+    Compiled equivalent of QLPPLS.func_restricted, the q-weighted sum of absolute residuals with
+    the linear params from the least squares solution. Returns inf when the linear system cannot
+    be solved.
+    """
+    ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+    if not ok:
+        return np.inf
+    loss = 0.0
+    for i in range(len(t)):
+        dt = np.abs(tc - t[i]) + 1e-8
+        phase = w * np.log(dt)
+        e = a + dt ** m * (b + c1 * np.cos(phase) + c2 * np.sin(phase)) - p[i]
+        loss += q * np.abs(e)
+    if not np.isfinite(loss):
+        return np.inf
+    return loss
+
+
+@njit(nogil=True, cache=True)
+def _cost(t, p, tc, m, w, q):
+    """
+    Loss minimised by the compiled optimizers: least squares when q < 0, otherwise the quantile
+    loss of QLPPLS.
+    """
+    if q < 0:
+        return _profile_cost(t, p, tc, m, w)
+    return _quantile_cost(t, p, tc, m, w, q)
+
+
+@njit(nogil=True, cache=True)
+def _lppls_residuals(t, p, tc, m, w):
+    """
+    Returns:
+        ok, residuals of the LPPLS model (model minus observed) with the linear params profiled out
+    """
+    residuals = np.empty(len(t))
+    ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+    if not ok:
+        return False, residuals
+    for i in range(len(t)):
+        dt = np.abs(tc - t[i]) + 1e-8
+        phase = w * np.log(dt)
+        residuals[i] = a + dt ** m * (b + c1 * np.cos(phase) + c2 * np.sin(phase)) - p[i]
+    return True, residuals
+
+
+@njit(nogil=True, cache=True)
+def _lppls_residual_jacobian(t, p, tc, m, w):
+    """
+    Exact Jacobian of _lppls_residuals with respect to (tc, m, w), including the dependence of
+    the profiled linear params (variable projection). With X the Nx4 basis [1, f, g, h], beta the
+    linear params and e the residuals, column k is
+        dX_k beta - X (X'X)^-1 (X' dX_k beta + dX_k' e)
+    Returns:
+        ok, Nx3 Jacobian
+    """
+    n = len(t)
+    jac = np.zeros((n, 3))
+    ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+    if not ok:
+        return False, jac
+
+    X = np.empty((n, 4))
+    # derivatives of the f, g, h columns with respect to tc, m and w
+    dX = np.zeros((3, n, 4))
+    e = np.empty(n)
+    for i in range(n):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        phase = w * log_dt
+        fi = dt ** m
+        gi = fi * np.cos(phase)
+        hi = fi * np.sin(phase)
+        X[i, 0] = 1.0
+        X[i, 1] = fi
+        X[i, 2] = gi
+        X[i, 3] = hi
+        e[i] = a + b * fi + c1 * gi + c2 * hi - p[i]
+
+        s = np.sign(tc - t[i]) / dt
+        dX[0, i, 1] = m * fi * s
+        dX[0, i, 2] = (m * gi - w * hi) * s
+        dX[0, i, 3] = (m * hi + w * gi) * s
+        dX[1, i, 1] = fi * log_dt
+        dX[1, i, 2] = gi * log_dt
+        dX[1, i, 3] = hi * log_dt
+        dX[2, i, 2] = -hi * log_dt
+        dX[2, i, 3] = gi * log_dt
+
+    XtX = X.T.dot(X)
+    for i in range(4):
+        XtX[i, i] += 1e-8
+    beta = np.array([a, b, c1, c2])
+    for k in range(3):
+        v = dX[k].dot(beta)
+        rhs = X.T.dot(v) + dX[k].T.dot(e)
+        solved, z0, z1, z2, z3 = _solve_4x4(XtX.copy(), rhs)
+        if not solved:
+            return False, jac
+        jac[:, k] = v - X.dot(np.array([z0, z1, z2, z3]))
+    return True, jac
+
+
+@njit(nogil=True, cache=True)
+def _profile_cost_grad(t, p, tc, m, w):
+    """
+    Gradient of _profile_cost with respect to (tc, m, w). At the profiled linear params the normal
+    equations give X'e = 0, so the terms through the linear params vanish and only
+    2 e' dX_k beta remains.
+    Returns:
+        ok, gradient (3)
+    """
+    grad = np.zeros(3)
+    ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+    if not ok:
+        return False, grad
+    for i in range(len(t)):
+        dt = np.abs(tc - t[i]) + 1e-8
+        log_dt = np.log(dt)
+        phase = w * log_dt
+        fi = dt ** m
+        gi = fi * np.cos(phase)
+        hi = fi * np.sin(phase)
+        e2 = 2.0 * (a + b * fi + c1 * gi + c2 * hi - p[i])
+        s = np.sign(tc - t[i]) / dt
+        grad[0] += e2 * s * (b * m * fi + c1 * (m * gi - w * hi) + c2 * (m * hi + w * gi))
+        grad[1] += e2 * log_dt * (b * fi + c1 * gi + c2 * hi)
+        grad[2] += e2 * log_dt * (c2 * gi - c1 * hi)
+    return np.isfinite(grad[0]) and np.isfinite(grad[1]) and np.isfinite(grad[2]), grad
+
+
+@njit(nogil=True, cache=True)
+def _cost_grid(t, p, tcs, ms, ws, q=-1.0):
+    """
+    Profiled cost on the full tensor grid tcs x ms x ws in one compiled pass. `q` selects the
+    loss, see _cost.
+    Returns:
+        np.ndarray with shape (len(tcs), len(ms), len(ws)), inf where the fit failed
+    """
+    costs = np.empty((len(tcs), len(ms), len(ws)))
+    for i in range(len(tcs)):
+        for j in range(len(ms)):
+            for k in range(len(ws)):
+                costs[i, j, k] = _cost(t, p, tcs[i], ms[j], ws[k], q)
+    return costs
+
+
+@njit(nogil=True, cache=True)
+def _nested_sufficient_stats(t, p, tc, m, w):
+    """
+    Suffix sums of the basis terms used by the normal equations, so that the sums over
+    any slice t[j:] sharing the right edge of `t` are read off in O(1).
+    Row j holds the sums over t[j:] of
+        1, fi, gi, hi, fi^2, figi, fihi, gi^2, gihi, hi^2, yi, yifi, yigi, yihi, yi^2
+    Returns:
+        (N+1)x15 array, the last row being all zeros.
+    """
+    n = len(t)
+    stats = np.zeros((n + 1, 15))
+    for i in range(n - 1, -1, -1):
+        dt = np.abs(tc - t[i]) + 1e-8
+        phase = w * np.log(dt)
+        fi = dt ** m
+        gi = fi * np.cos(phase)
+        hi = fi * np.sin(phase)
+        yi = p[i]
+        terms = (
+            1.0, fi, gi, hi, fi * fi, fi * gi, fi * hi, gi * gi, gi * hi, hi * hi,
+            yi, yi * fi, yi * gi, yi * hi, yi * yi,
+        )
+        for k in range(15):
+            stats[i, k] = stats[i + 1, k] + terms[k]
+    return stats
+
+
+@njit(nogil=True, cache=True)
+def _nested_profile(t, p, tc, m, w, starts):
+    """
+    Linear params and sum of squared residuals for every sub-window t[j:] with j in
+    `starts`, for one candidate (tc, m, w), from a single pass of suffix sums.
+    Returns:
+        params (Kx4 of a, b, c1, c2), cost (K), ok (K)
+    """
+    stats = _nested_sufficient_stats(t, p, tc, m, w)
+    k_starts = len(starts)
+    params = np.zeros((k_starts, 4))
+    cost = np.full(k_starts, np.inf)
+    ok = np.zeros(k_starts, dtype=np.bool_)
+    A = np.empty((4, 4))
+    r = np.empty(4)
+    for k in range(k_starts):
+        s = stats[starts[k]]
+        A[0, 0] = s[0]
+        A[0, 1] = s[1]
+        A[0, 2] = s[2]
+        A[0, 3] = s[3]
+        A[1, 1] = s[4]
+        A[1, 2] = s[5]
+        A[1, 3] = s[6]
+        A[2, 2] = s[7]
+        A[2, 3] = s[8]
+        A[3, 3] = s[9]
+        for i in range(4):
+            for j in range(i):
+                A[i, j] = A[j, i]
+        r[0] = s[10]
+        r[1] = s[11]
+        r[2] = s[12]
+        r[3] = s[13]
+        # SSE = y'y - 2 beta'X'y + beta'X'X beta, evaluated on the unregularised system
+        M = A.copy()
+        rhs = r.copy()
+        for i in range(4):
+            M[i, i] += 1e-8
+        solved, a, b, c1, c2 = _solve_4x4(M, rhs)
+        if not solved:
+            continue
+        beta = np.array([a, b, c1, c2])
+        sse = s[14] - 2.0 * np.dot(beta, r) + np.dot(beta, A.dot(beta))
+        if not np.isfinite(sse):
+            continue
+        params[k] = beta
+        cost[k] = max(sse, 0.0)
+        ok[k] = True
+    return params, cost, ok
+
+
+@njit(nogil=True, cache=True)
+def _nested_cost_grid(t, p, tcs, ms, ws, starts):
+    """
+    Least squares cost of every sub-window t[j:] with j in `starts` on the full tensor grid
+    tcs x ms x ws, one pass of suffix sums per grid point (see _nested_profile) instead of one
+    pass per sub-window and grid point as with _cost_grid.
+    Returns:
+        np.ndarray with shape (len(starts), len(tcs), len(ms), len(ws)), inf where the fit failed
+    """
+    costs = np.empty((len(starts), len(tcs), len(ms), len(ws)))
+    for i in range(len(tcs)):
+        for j in range(len(ms)):
+            for k in range(len(ws)):
+                _, cost, _ = _nested_profile(t, p, tcs[i], ms[j], ws[k], starts)
+                costs[:, i, j, k] = cost
+    return costs
+
+
+@njit(nogil=True, cache=True)
+def _nelder_mead(t, p, x0, max_iter, xatol, fatol, q=-1.0):
+    """
+    Nelder-Mead over (tc, m, w) using the same coefficients, initial simplex and
+    convergence test as scipy.optimize.minimize(method='Nelder-Mead'). `q` selects the loss,
+    see _cost.
+    Returns:
+        x, fun, nfev, success
+    """
+    n = 3
+    sim = np.empty((n + 1, n))
+    fsim = np.empty(n + 1)
+    sim[0] = x0
+    for k in range(n):
+        y = x0.copy()
+        if y[k] != 0:
+            y[k] = 1.05 * y[k]
+        else:
+            y[k] = 0.00025
+        sim[k + 1] = y
+    for k in range(n + 1):
+        fsim[k] = _cost(t, p, sim[k, 0], sim[k, 1], sim[k, 2], q)
+    nfev = n + 1
+
+    order = np.argsort(fsim)
+    sim = sim[order]
+    fsim = fsim[order]
+
+    iterations = 1
+    while nfev < max_iter and iterations < max_iter:
+        xdiff = 0.0
+        fdiff = 0.0
+        for k in range(1, n + 1):
+            fdiff = max(fdiff, np.abs(fsim[0] - fsim[k]))
+            for j in range(n):
+                xdiff = max(xdiff, np.abs(sim[k, j] - sim[0, j]))
+        if xdiff <= xatol and fdiff <= fatol:
+            break
+
+        xbar = np.zeros(n)
+        for k in range(n):
+            xbar += sim[k]
+        xbar /= n
+
+        xr = 2.0 * xbar - sim[n]
+        fxr = _cost(t, p, xr[0], xr[1], xr[2], q)
+        nfev += 1
+        doshrink = False
+
+        if fxr < fsim[0]:
+            xe = 3.0 * xbar - 2.0 * sim[n]
+            fxe = _cost(t, p, xe[0], xe[1], xe[2], q)
+            nfev += 1
+            if fxe < fxr:
+                sim[n] = xe
+                fsim[n] = fxe
+            else:
+                sim[n] = xr
+                fsim[n] = fxr
+        elif fxr < fsim[n - 1]:
+            sim[n] = xr
+            fsim[n] = fxr
+        elif fxr < fsim[n]:
+            xc = 1.5 * xbar - 0.5 * sim[n]
+            fxc = _cost(t, p, xc[0], xc[1], xc[2], q)
+            nfev += 1
+            if fxc <= fxr:
+                sim[n] = xc
+                fsim[n] = fxc
+            else:
+                doshrink = True
+        else:
+            xcc = 0.5 * xbar + 0.5 * sim[n]
+            fxcc = _cost(t, p, xcc[0], xcc[1], xcc[2], q)
+            nfev += 1
+            if fxcc < fsim[n]:
+                sim[n] = xcc
+                fsim[n] = fxcc
+            else:
+                doshrink = True
+
+        if doshrink:
+            for k in range(1, n + 1):
+                sim[k] = sim[0] + 0.5 * (sim[k] - sim[0])
+                fsim[k] = _cost(t, p, sim[k, 0], sim[k, 1], sim[k, 2], q)
+            nfev += n
+
+        order = np.argsort(fsim)
+        sim = sim[order]
+        fsim = fsim[order]
+        iterations += 1
+
+    success = nfev < max_iter and iterations < max_iter and np.isfinite(fsim[0])
+    return sim[0].copy(), fsim[0], nfev, success
+
+
+@njit(nogil=True, cache=True)
+def _nelder_mead_batch(t, p, seeds, max_iter, xatol, fatol, q=-1.0):
+    """
+    Runs _nelder_mead from every row of `seeds` (Nx3 array of tc, m, w) without leaving
+    compiled code.
+    Returns:
+        x (Nx3), fun (N), nfev (N), success (N)
+    """
+    n_seeds = seeds.shape[0]
+    xs = np.empty((n_seeds, 3))
+    fs = np.empty(n_seeds)
+    nfevs = np.empty(n_seeds, dtype=np.int64)
+    success = np.zeros(n_seeds, dtype=np.bool_)
+    for s in range(n_seeds):
+        x, f, nfev, ok = _nelder_mead(t, p, seeds[s], max_iter, xatol, fatol, q)
+        xs[s] = x
+        fs[s] = f
+        nfevs[s] = nfev
+        success[s] = ok
+    return xs, fs, nfevs, success
+
+
+@njit(parallel=True, cache=True)
+def _nested_fit_sweep(t, p, starts, window_size, nested_starts, seeds, max_iter, xatol, fatol, q=-1.0):
+    """
+    Fits every nested window of every outer window in one compiled call, the outer windows spread over
+    threads with prange. Nested window j of outer window i is t[starts[i] + nested_starts[j]:starts[i] + window_size];
+    _nelder_mead runs from each of seeds[i, j] and the best converged search is kept, as in LPPLS._fit_numba.
+    Returns:
+        params (n_windows x n_nested x 7 of tc, m, w, a, b, c1, c2, zero where the fit failed),
+        nfev (n_windows x n_nested), status (n_windows x n_nested indices into FIT_STATUS)
+    """
+    n_windows = starts.shape[0]
+    n_nested = nested_starts.shape[0]
+    params = np.zeros((n_windows, n_nested, 7))
+    nfev = np.zeros((n_windows, n_nested), dtype=np.int64)
+    status = np.ones((n_windows, n_nested), dtype=np.int64)  # no_convergence
+    for i in prange(n_windows):
+        hi = starts[i] + window_size
+        for j in range(n_nested):
+            lo = starts[i] + nested_starts[j]
+            tw = t[lo:hi]
+            pw = p[lo:hi]
+            found = False
+            best_f = np.inf
+            best_x = np.zeros(3)
+            for s in range(seeds.shape[2]):
+                x, f, n, ok = _nelder_mead(tw, pw, seeds[i, j, s], max_iter, xatol, fatol, q)
+                nfev[i, j] += n
+                if ok and (not found or f < best_f):
+                    found = True
+                    best_f = f
+                    best_x = x
+            if not found:
+                continue
+            ok, a, b, c1, c2 = _solve_linear_params(tw, pw, best_x[0], best_x[1], best_x[2])
+            if not ok:
+                status[i, j] = 2  # linalg_error
+                continue
+            params[i, j, 0] = best_x[0]
+            params[i, j, 1] = best_x[1]
+            params[i, j, 2] = best_x[2]
+            params[i, j, 3] = a
+            params[i, j, 4] = b
+            params[i, j, 5] = c1
+            params[i, j, 6] = c2
+            status[i, j] = 0  # converged
+    return params, nfev, status
+
+
+def compile_kernels():
+    """
+    Compiles the numba kernels into the on-disk cache (__pycache__ next to this module, or NUMBA_CACHE_DIR), e.g.
+    while building a container image, so that fresh processes load them instead of compiling on the first fit.
+    """
+    t = np.linspace(0.0, 1.0, 8)
+    p = np.linspace(1.0, 2.0, 8)
+    seeds = np.array([[1.1, 0.5, 8.0]])
+    for q in (-1.0, 0.5):
+        _nelder_mead_batch(t, p, seeds, 1, 1e-4, 1e-4, q)
+        _cost_grid(t, p, seeds[:, 0], seeds[:, 1], seeds[:, 2], q)
+        with _fork_safe_threading_layer():
+            _nested_fit_sweep(t, p, np.array([0], dtype=np.int64), 8, np.array([0], dtype=np.int64), seeds[None, None], 1, 1e-4, 1e-4, q)
+    _nested_profile(t, p, 1.1, 0.5, 8.0, np.array([0, 2], dtype=np.int64))
+    _nested_cost_grid(t, p, seeds[:, 0], seeds[:, 1], seeds[:, 2], np.array([0, 2], dtype=np.int64))
+    _profile_cost_grad(t, p, 1.1, 0.5, 8.0)
+    _lppls_residual_jacobian(t, p, 1.1, 0.5, 8.0)
+    LPPLS.lppls(t, 1.1, 0.5, 8.0, 1.0, 1.0, 0.1, 0.1)
+    LPPLS.matrix_equation(np.array([t, p]), 1.1, 0.5, 8.0)
+
+
+# scipy.optimize.minimize methods that are given the analytic gradient of the cost
+GRADIENT_MINIMIZERS = ("CG", "BFGS", "Newton-CG", "L-BFGS-B", "TNC", "SLSQP", "trust-constr")
+
+NESTED_FIT_FIELDS = ("tc", "m", "w", "a", "b", "c", "c1", "c2", "O", "D", "t1", "t2")
+# outcome of a fit, see LPPLS.fit; FIT_STATS_FIELDS["status"] is an index into FIT_STATUS
+FIT_STATUS = ("converged", "no_convergence", "linalg_error", "error", "budget_exhausted", "skipped")
+# keys of the `budget` argument of LPPLS.fit; skip_after only applies to nested fits
+FIT_BUDGET_KEYS = ("agree", "tol", "max_nfev", "max_time", "skip_after")
+FIT_STATS_FIELDS = ("wall_time", "searches", "nfev", "status")
+# one record per nested fit; p2 is the observed value at the shared right edge t2
+NESTED_FIT_DTYPE = np.dtype([(f, np.float64) for f in NESTED_FIT_FIELDS + ("p2",) + FIT_STATS_FIELDS])
+
+# conditions a nested fit must satisfy to count towards the confidence indicators. tc must lie within
+# tc_pct * (t2 - t1) of t2, but no more than tc_days_before before or tc_days_after after t2.
+DEFAULT_FILTER_CONDITIONS = {
+    "m_min": 0.0,
+    "m_max": 1.0,
+    "w_min": 2.0,
+    "w_max": 15.0,
+    "O_min": 2.5,
+    "D_min": 0.5,
+    "tc_pct": 0.5,
+    "tc_days_before": 60,
+    "tc_days_after": 252,
+}
+
+# per-process state of the nested fit workers, set once by _init_nested_fits
+_shared_state = {}
+
+
+def _init_nested_fits(model, fit_args, obs_name=None, obs_shape=None, res_name=None, res_shape=None):
+    _shared_state["model"] = model
+    _shared_state["fit_args"] = fit_args
+    if obs_name is None:
+        _shared_state["obs"] = model.observations
+        _shared_state["res"] = None
+        return
+    obs_shm = shared_memory.SharedMemory(name=obs_name)
+    res_shm = shared_memory.SharedMemory(name=res_name)
+    _shared_state["shm"] = (obs_shm, res_shm)
+    _shared_state["obs"] = np.ndarray(obs_shape, dtype=np.float64, buffer=obs_shm.buf)
+    _shared_state["res"] = np.ndarray(res_shape, dtype=NESTED_FIT_DTYPE, buffer=res_shm.buf)
+
+
+def _nested_fit_task(task):
+    """
+    Fits the nested windows lo..hi-1 of the outer window observations[:, start:start + window_size].
+    With shared memory the fits are written into row `row` of the shared result array instead of
+    being sent back.
+    Returns:
+        row, lo, structured np.ndarray of NESTED_FIT_DTYPE or None
+    """
+    row, start, lo, hi = task
+    window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options = _shared_state["fit_args"]
+    obs = _shared_state["obs"][:, start : start + window_size]
+    block = _shared_state["model"]._func_compute_nested_fit_block(
+        (
+            obs,
+            window_size,
+            start,
+            smallest_window_size,
+            outer_increment,
+            inner_increment,
+            max_searches,
+            minimizer,
+            dict(options, slices=(lo, hi)),
+        )
+    )
+    if _shared_state["res"] is not None:
+        _shared_state["res"][row, lo:hi] = block
+        return row, lo, None
+    return row, lo, block
+
+
+def _nested_fit_chunk(model, fit_args, chunk):
+    """
+    Fits a chunk of (row, start, lo, hi, obs) tasks, where obs is the outer window, for executors
+    that cannot hold per-worker state. See LPPLS.nested_fits.
+    Returns:
+        list of (row, lo, structured np.ndarray of NESTED_FIT_DTYPE)
+    """
+    window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options = fit_args
+    # every chunk fits on its own copy, so that the threads of a ThreadPoolExecutor do not share coef_ and
+    # fit_stats with each other or with the caller's model
+    model = copy.deepcopy(model)
+    return [
+        (
+            row,
+            lo,
+            model._func_compute_nested_fit_block(
+                (
+                    obs,
+                    window_size,
+                    start,
+                    smallest_window_size,
+                    outer_increment,
+                    inner_increment,
+                    max_searches,
+                    minimizer,
+                    dict(options, slices=(lo, hi)),
+                )
+            ),
+        )
+        for row, start, lo, hi, obs in chunk
+    ]
+
+
+def _multiscale_fit_task(task):
+    """
+    Fits the windows observations[:, lo:hi] for every lo in `los`, for LPPLS.mp_compute_multiscale_fits. Seeded
+    sweeps draw the random seeds of each window from a stream keyed by (hi, lo).
+    Returns:
+        hi, los, structured np.ndarray of NESTED_FIT_DTYPE with one element per window
+    """
+    hi, los = task
+    max_searches, minimizer, options = _shared_state["fit_args"]
+    model = _shared_state["model"]
+    seed = options.get("seed")
+    block = np.zeros(len(los), dtype=NESTED_FIT_DTYPE)
+    for k, lo in enumerate(los):
+        obs = _shared_state["obs"][:, lo:hi]
+        stats = {}
+        params = model._fit_nested_window(
+            obs,
+            max_searches,
+            minimizer,
+            rng=None if seed is None else model._nested_fit_rng(seed, hi, lo),
+            grid=options.get("grid"),
+            budget=options.get("budget"),
+            stats=stats,
+        )
+        block[k] = model._nested_fit_record(params, obs, stats)
+    return hi, los, block
+
+
+class _NestedFitCheckpoint(object):
+
+    def __init__(self, path, key, shape, interval=60.0):
+        """
+        Completed outer windows of a nested fit sweep, written to a local .npz file every `interval` seconds
+        so that a restarted sweep with the same configuration only fits the windows that are missing.
+        Args:
+            path (str): checkpoint file. A file written under another configuration is ignored and replaced.
+            key (str): hash of the observations and fit configuration, see LPPLS._nested_fit_checkpoint_key.
+            shape (tuple): (n_windows, n_nested) shape of the sweep's result.
+            interval (float): minimum number of seconds between writes.
+        """
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.res = np.zeros(shape, dtype=NESTED_FIT_DTYPE)
+        self.done = np.zeros(shape[0], dtype=bool)
+        self._last_flush = time.perf_counter()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as saved:
+            if str(saved["key"]) == self.key and saved["res"].shape == self.res.shape:
+                self.res = saved["res"]
+                self.done = saved["done"]
+
+    def add(self, row, block):
+        self.res[row] = block
+        self.done[row] = True
+        if time.perf_counter() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        # write next to the target and rename, so a crash mid-write never leaves a truncated checkpoint
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, key=np.array(self.key), res=self.res, done=self.done)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+        self._last_flush = time.perf_counter()
 
 
 class LPPLS(object):
@@ -25,9 +763,10 @@ class LPPLS(object):
         self.observations = observations
         self.coef_ = {}
         self.indicator_result = []
+        self.fit_stats = None
 
     @staticmethod
-    @njit
+    @njit(cache=True)
     def lppls(t, tc, m, w, a, b, c1, c2):
         dt = np.abs(tc - t) + 1e-8
         return a + np.power(dt, m) * (
@@ -59,8 +798,28 @@ class LPPLS(object):
         delta = np.power(delta, 2)
         return np.sum(delta)
 
+    def func_restricted_jac(self, x, *args):
+        """
+        Analytic gradient of func_restricted with respect to (tc, m, w), passed as `jac` to
+        scipy.optimize.minimize for the methods in GRADIENT_MINIMIZERS.
+        Args:
+            x(np.ndarray):  1-D array with shape (n,).
+            args:           Tuple of the fixed parameters needed to completely specify the function.
+        Returns:
+            (np.ndarray) with shape (3,)
+        """
+        observations = args[0]
+        ok, grad = _profile_cost_grad(
+            np.ascontiguousarray(observations[0, :], dtype=np.float64),
+            np.ascontiguousarray(observations[1, :], dtype=np.float64),
+            x[0], x[1], x[2],
+        )
+        if not ok:
+            raise np.linalg.LinAlgError("Singular matrix")
+        return grad
+
     @staticmethod
-    @njit
+    @njit(cache=True)
     def matrix_equation(observations, tc, m, w):
         """
         Derive linear parameters in LPPLs from nonlinear ones.
@@ -106,68 +865,421 @@ class LPPLS(object):
 
         return np.linalg.solve(matrix_1, matrix_2)
 
-    def fit(self, max_searches, minimizer="Nelder-Mead", obs=None):
+    def nested_matrix_equation(self, observations, tc, m, w, starts):
+        """
+        Derive linear params in LPPLs for every nested sub-window observations[:, j:] sharing
+        the right edge of `observations`, reusing one set of suffix sums for the given (tc, m, w).
+        Args:
+            observations (np.ndarray): 2xM the observed time-series data.
+            tc, m, w (float): nonlinear params shared by all sub-windows.
+            starts (iterable of int): column index j of the first observation of each sub-window.
+        Returns:
+            params (Kx4 np.ndarray of a, b, c1, c2), cost (K np.ndarray of sum of squared residuals,
+            inf where the linear system could not be solved)
+        """
+        t = np.ascontiguousarray(observations[0, :], dtype=np.float64)
+        p = np.ascontiguousarray(observations[1, :], dtype=np.float64)
+        starts = np.asarray(starts, dtype=np.int64)
+        params, cost, _ = _nested_profile(t, p, tc, m, w, starts)
+        return params, cost
+
+    def fit(
+        self, max_searches, minimizer="Nelder-Mead", obs=None, init=None, rng=None, grid=None, stats=None, budget=None
+    ):
         """
         Args:
             max_searches (int): The maxi amount of searches to perform before giving up. The literature suggests 25.
             minimizer (str): See list of valid methods to pass to scipy.optimize.minimize:
                 https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.minimize.html#scipy.optimize.minimize
+                Pass "numba" to run all `max_searches` seeds as one batch through the compiled
+                Nelder-Mead engine and keep the best converged result.
             obs (Mx2 numpy array): the observed time-series data. Optional, if not included will use self.scaled_obs
+            init (tuple): optional (tc, m, w) to start the first search from, typically the solution of a
+                neighbouring window. The remaining searches fall back to random seeds.
+            rng (np.random.Generator): source of the random seeds. Defaults to the global `random` module.
+            grid (int, tuple): evaluate the cost on a grid of this many (tc, m, w) points per axis over
+                _get_init_limits first, and start the searches from the best local minima of the grid,
+                at most `max_searches` of them, instead of random seeds. See _grid_seeds. An nx3
+                np.ndarray is taken as grid seeds computed beforehand, e.g. by _nested_grid_seeds.
+            stats (dict): if given, filled with the wall_time in seconds, the number of searches and of
+                objective evaluations (nfev) used, the status (one of FIT_STATUS) and failures, a dict of
+                the number of failed searches per FIT_STATUS category.
+            budget (dict): adaptive search budget, any of
+                agree (int): keep searching until this many converged searches agree with the best one, then
+                    return the best. Defaults to 1, i.e. the first converged search, or for "numba" the best of
+                    one batch of all seeds.
+                tol (float): searches agree when each of (tc, m, w) is within tol times the width of its
+                    _get_init_limits range of the best search. Defaults to 0.01.
+                max_nfev (int): stop starting new searches once this many objective evaluations were used.
+                max_time (float): stop starting new searches after this many seconds.
+                Caps are checked between searches (between batches of `agree` seeds for "numba", so without
+                agree they only keep its single batch from starting) and never change which fit is returned
+                when they are not hit; a fit that hits one before any search converged has status
+                "budget_exhausted".
         Returns:
             tc, m, w, a, b, c, c1, c2, O, D
         """
         if obs is None:
             obs = self.observations
 
-        search_count = 0
-        # find bubble
-        while search_count < max_searches:
-            # tc_init_min, tc_init_max = self._get_tc_bounds(obs, 0.50, 0.50)
-            t1 = obs[0, 0]
-            t2 = obs[0, -1]
-
-            # @TODO make configurable
-            # set random initialization limits for non-linear params
-            init_limits = [
-                # (tc_init_min, tc_init_max),
-                (t2 - 0.2 * (t2 - t1), t2 + 0.2 * (t2 - t1)),  # tc
-                (0.1, 1.0),  # m
-                (6.0, 13.0),  # ω
-            ]
-
-            # randomly choose vals within bounds for non-linear params
-            non_lin_vals = [random.uniform(a[0], a[1]) for a in init_limits]
+        start = time.perf_counter()
+        if stats is None:
+            stats = {}
+        stats.update(wall_time=0.0, searches=0, nfev=0, status="no_convergence", failures={})
+        if budget is not None:
+            assert set(budget) <= set(FIT_BUDGET_KEYS), f"Unknown budget keys: {set(budget) - set(FIT_BUDGET_KEYS)}"
 
-            tc = non_lin_vals[0]
-            m = non_lin_vals[1]
-            w = non_lin_vals[2]
-            seed = np.array([tc, m, w])
+        grid_seeds = grid if grid is None or isinstance(grid, np.ndarray) else self._grid_seeds(obs, grid, max_searches)
 
-            # Increment search count on SVD convergence error, but raise all other exceptions.
-            try:
-                tc, m, w, a, b, c, c1, c2 = self.estimate_params(obs, seed, minimizer)
-                O = self.get_oscillations(w, tc, t1, t2)
-                D = self.get_damping(m, w, b, c)
-                return tc, m, w, a, b, c, c1, c2, O, D
-            except Exception as e:
-                # print(e)
+        result = (0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        if minimizer == "numba":
+            result = self._fit_numba(max_searches, obs, init, rng, grid_seeds, stats, budget, start)
+        else:
+            if grid_seeds is not None:
+                max_searches = len(grid_seeds) + (init is not None)
+            grid_seeds = iter(() if grid_seeds is None else grid_seeds.tolist())
+            agree = 1 if budget is None else budget.get("agree", 1)
+            converged = []
+
+            search_count = 0
+            # find bubble
+            while search_count < max_searches:
+                if budget is not None and self._over_budget(budget, stats, start):
+                    if not converged:
+                        stats["status"] = "budget_exhausted"
+                    break
+
+                t1 = obs[0, 0]
+                t2 = obs[0, -1]
+
+                if search_count == 0 and init is not None:
+                    non_lin_vals = list(init)
+                elif grid is not None:
+                    non_lin_vals = next(grid_seeds)
+                else:
+                    # randomly choose vals within bounds for non-linear params
+                    non_lin_vals = self._draw_seeds(obs, 1, rng)[0].tolist()
+
+                tc = non_lin_vals[0]
+                m = non_lin_vals[1]
+                w = non_lin_vals[2]
+                seed = np.array([tc, m, w])
+
+                # Increment search count on any failure and record why the search failed.
+                stats["searches"] += 1
+                try:
+                    tc, m, w, a, b, c, c1, c2 = self.estimate_params(obs, seed, minimizer, stats)
+                    O = self.get_oscillations(w, tc, t1, t2)
+                    D = self.get_damping(m, w, b, c)
+                    result = (tc, m, w, a, b, c, c1, c2, O, D)
+                    stats["status"] = "converged"
+                    if agree <= 1:
+                        break
+                    converged.append((self._fit_cost(obs, tc, m, w), result))
+                    stats["nfev"] += 1
+                    costs = np.array([f for f, _ in converged])
+                    xs = np.array([r[:3] for _, r in converged])
+                    if self._count_agreeing(xs, costs, obs, budget) >= agree:
+                        break
+                except UnboundLocalError:
+                    self._record_failure(stats, "no_convergence")
+                except np.linalg.LinAlgError:
+                    self._record_failure(stats, "linalg_error")
+                except Exception as e:
+                    # print(e)
+                    self._record_failure(stats, "error")
                 search_count += 1
-        return 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
 
-    def estimate_params(self, observations, seed, minimizer):
+            if converged:
+                result = min(converged, key=lambda fit: fit[0])[1]
+                for coef, value in zip(["tc", "m", "w", "a", "b", "c", "c1", "c2"], result):
+                    self.coef_[coef] = value
+                stats["status"] = "converged"
+
+        stats["wall_time"] = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _record_failure(stats, status, n=1):
+        """
+        Counts `n` failed searches of category `status` (one of FIT_STATUS) in the stats dict of fit.
+        """
+        if n:
+            stats["status"] = status
+            stats["failures"][status] = stats["failures"].get(status, 0) + n
+
+    @staticmethod
+    def _over_budget(budget, stats, start):
+        """
+        Returns:
+            (bool) whether the max_nfev or max_time cap of a fit `budget` started at `start` is used up
+        """
+        max_nfev = budget.get("max_nfev")
+        max_time = budget.get("max_time")
+        return (max_nfev is not None and stats["nfev"] >= max_nfev) or (
+            max_time is not None and time.perf_counter() - start >= max_time
+        )
+
+    def _fit_cost(self, obs, tc, m, w):
+        """
+        Scalar cost used to rank converged searches, also for subclasses whose func_restricted returns residuals.
+        Returns:
+            (float) the compiled loss _cost selected by _compiled_loss_q at (tc, m, w)
+        """
+        t = np.ascontiguousarray(obs[0, :], dtype=np.float64)
+        p = np.ascontiguousarray(obs[1, :], dtype=np.float64)
+        return _cost(t, p, float(tc), float(m), float(w), self._compiled_loss_q())
+
+    def _count_agreeing(self, xs, costs, obs, budget):
+        """
+        Args:
+            xs (np.ndarray): nx3 (tc, m, w) of the converged searches.
+            costs (np.ndarray): cost of each search.
+        Returns:
+            (int) number of searches, the best one included, that agree with the best one, see fit
+        """
+        scale = np.array([hi - lo for lo, hi in self._get_init_limits(obs)])
+        best = xs[np.argmin(costs)]
+        return int(np.all(np.abs(xs - best) <= budget.get("tol", 0.01) * scale, axis=1).sum())
+
+    def _fit_numba(self, max_searches, obs, init=None, rng=None, seeds=None, stats=None, budget=None, start=None):
+        """
+        Fits all `max_searches` random seeds in a single call to the compiled Nelder-Mead
+        engine, avoiding the Python/scipy callback per cost evaluation.
+        Args:
+            max_searches (int): number of random seeds to optimize.
+            obs (Mx2 numpy array): the observed time-series data.
+            init (tuple): optional (tc, m, w) tried on its own first; the random batch only runs
+                when it does not converge.
+            rng (np.random.Generator): source of the random seeds.
+            seeds (np.ndarray): nx3 seeds to use instead of random ones, e.g. from _grid_seeds.
+            stats (dict): see fit.
+            budget (dict): see fit. With `agree` the seeds run in batches of `agree` until enough agree or a cap
+                is hit, otherwise in one batch that a cap can only keep from starting.
+            start (float): time.perf_counter() when the fit started, for the max_time cap.
+        Returns:
+            tc, m, w, a, b, c, c1, c2, O, D
+        """
+        if stats is None:
+            stats = {"searches": 0, "nfev": 0, "status": "no_convergence", "failures": {}}
+        if start is None:
+            start = time.perf_counter()
+        t1 = obs[0, 0]
+        t2 = obs[0, -1]
+        t = np.ascontiguousarray(obs[0, :], dtype=np.float64)
+        p = np.ascontiguousarray(obs[1, :], dtype=np.float64)
+
+        success = np.zeros(0, dtype=np.bool_)
+        n_init = 1 if init is not None and max_searches > 0 else 0
+        n_seeds = max_searches - n_init if seeds is None else len(seeds)
+        if n_init:
+            xs, fs, nfevs, success = _nelder_mead_batch(
+                t, p, np.array([init], dtype=np.float64), 600, 1e-4, 1e-4, self._compiled_loss_q()
+            )
+            stats["searches"] += 1
+            stats["nfev"] += int(nfevs.sum())
+            self._record_failure(stats, "no_convergence", int((~success).sum()))
+
+        if not success.any():
+            batch = n_seeds if budget is None or "agree" not in budget else max(budget["agree"], 1)
+            xs, fs, success = np.zeros((0, 3)), np.zeros(0), np.zeros(0, dtype=np.bool_)
+            for i in range(0, n_seeds, max(batch, 1)):
+                if budget is not None and self._over_budget(budget, stats, start):
+                    break
+                n = min(batch, n_seeds - i)
+                batch_seeds = self._draw_seeds(obs, n, rng) if seeds is None else seeds[i : i + n]
+                batch_xs, batch_fs, nfevs, batch_success = _nelder_mead_batch(
+                    t, p, batch_seeds, 600, 1e-4, 1e-4, self._compiled_loss_q()
+                )
+                xs = np.concatenate([xs, batch_xs])
+                fs = np.concatenate([fs, batch_fs])
+                success = np.concatenate([success, batch_success])
+                stats["searches"] += n
+                stats["nfev"] += int(nfevs.sum())
+                self._record_failure(stats, "no_convergence", int((~batch_success).sum()))
+                if batch < n_seeds and success.any():
+                    if self._count_agreeing(xs[success], fs[success], obs, budget) >= budget.get("agree", 1):
+                        break
+        if not success.any():
+            exhausted = budget is not None and stats["searches"] < n_seeds + n_init
+            stats["status"] = "budget_exhausted" if exhausted else "no_convergence"
+            return 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
+
+        best = np.flatnonzero(success)[np.argmin(fs[success])]
+        tc, m, w = xs[best].tolist()
+        ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+        if not ok:
+            self._record_failure(stats, "linalg_error")
+            return 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
+        stats["status"] = "converged"
+        c = self.get_c(c1, c2)
+        for coef in ["tc", "m", "w", "a", "b", "c", "c1", "c2"]:
+            self.coef_[coef] = eval(coef)
+
+        O = self.get_oscillations(w, tc, t1, t2)
+        D = self.get_damping(m, w, b, c)
+        return tc, m, w, a, b, c, c1, c2, O, D
+
+    def _compiled_loss_q(self):
+        """
+        Returns:
+            (float) the `q` argument of the compiled cost _cost; negative selects least squares.
+        """
+        return -1.0
+
+    def _draw_seeds(self, obs, n, rng=None):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+            n (int): number of seeds
+            rng (np.random.Generator): source of randomness. Defaults to the global `random` module.
+        Returns:
+            nx3 np.ndarray of (tc, m, w) drawn uniformly within _get_init_limits
+        """
+        init_limits = self._get_init_limits(obs)
+        if rng is None:
+            seeds = [[random.uniform(a[0], a[1]) for a in init_limits] for _ in range(n)]
+            return np.array(seeds, dtype=np.float64).reshape(-1, 3)
+        # draws the same values, in the same order, as one rng.uniform call per parameter
+        lo, hi = np.array(init_limits, dtype=np.float64).T
+        return rng.uniform(lo, hi, size=(n, 3))
+
+    def _grid_seeds(self, obs, grid, k):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+            grid (int, tuple): number of points per axis, either one int for all of (tc, m, w) or a
+                tuple of three.
+            k (int): maximum number of seeds
+        Returns:
+            nx3 np.ndarray of (tc, m, w), n <= k, the local minima of the cost on an evenly spaced grid
+            over _get_init_limits ordered by cost, topped up with the next best grid points when
+            there are fewer than k minima.
+        """
+        sizes = (grid,) * 3 if np.isscalar(grid) else tuple(grid)
+        assert len(sizes) == 3, f"Expected grid to be an int or a tuple of 3 ints, got :{grid}"
+        axes = [np.linspace(lo, hi, n) for (lo, hi), n in zip(self._get_init_limits(obs), sizes)]
+        costs = _cost_grid(
+            np.ascontiguousarray(obs[0, :], dtype=np.float64),
+            np.ascontiguousarray(obs[1, :], dtype=np.float64),
+            *axes,
+            self._compiled_loss_q(),
+        )
+        return self._grid_minima(costs, axes, k)
+
+    def _nested_grid_seeds(self, obs, grid, starts, k):
+        """
+        Grid seeds for every nested window obs[:, j:] with j in `starts`, from one grid shared by all of
+        them and scored for all nested windows at once by _nested_cost_grid. The tc axis spans the
+        _get_init_limits of the largest nested window with the spacing _grid_seeds uses for the smallest,
+        and each nested window only keeps the points within its own limits.
+        Args:
+            obs (Mx2 numpy array): the observations of the outer window
+            grid, k: see _grid_seeds.
+            starts (iterable of int): first column of each nested window.
+        Returns:
+            list of nx3 np.ndarray of (tc, m, w), one per start as in _grid_seeds, or None when the loss is
+            not least squares or the grid has a single tc point, which _nested_cost_grid does not cover
+        """
+        sizes = (grid,) * 3 if np.isscalar(grid) else tuple(grid)
+        assert len(sizes) == 3, f"Expected grid to be an int or a tuple of 3 ints, got :{grid}"
+        if self._compiled_loss_q() >= 0 or sizes[0] < 2:
+            return None
+        limits = [self._get_init_limits(obs[:, j:]) for j in starts]
+        tc_limits = np.array([lim[0] for lim in limits])
+        step = (tc_limits[:, 1] - tc_limits[:, 0]).min() / (sizes[0] - 1)
+        tc_lo, tc_hi = tc_limits[:, 0].min(), tc_limits[:, 1].max()
+        n_tc = int(np.ceil((tc_hi - tc_lo) / step - 1e-9)) + 1
+        axes = [np.linspace(tc_lo, tc_lo + (n_tc - 1) * step, n_tc)] + [
+            np.linspace(lo, hi, n) for (lo, hi), n in zip(limits[0][1:], sizes[1:])
+        ]
+        costs = _nested_cost_grid(
+            np.ascontiguousarray(obs[0, :], dtype=np.float64),
+            np.ascontiguousarray(obs[1, :], dtype=np.float64),
+            *axes,
+            np.asarray(starts, dtype=np.int64),
+        )
+        seeds = []
+        for cost, (lo, hi) in zip(costs, tc_limits):
+            outside = (axes[0] < lo - 1e-9 * step) | (axes[0] > hi + 1e-9 * step)
+            cost[outside] = np.inf
+            seeds.append(self._grid_minima(cost, axes, k))
+        return seeds
+
+    @staticmethod
+    def _grid_minima(costs, axes, k):
+        """
+        Args:
+            costs (np.ndarray): cost on the tensor grid axes[0] x axes[1] x axes[2], inf where it failed
+            axes (list): the (tc, m, w) grid axes
+            k (int): maximum number of seeds
+        Returns:
+            nx3 np.ndarray of (tc, m, w), see _grid_seeds
+        """
+        # a point is a local minimum when no face neighbour has a lower cost
+        padded = np.pad(costs, 1, constant_values=np.inf)
+        is_min = np.isfinite(costs)
+        for axis in range(3):
+            for shift in (-1, 1):
+                neighbour = np.roll(padded, shift, axis=axis)[1:-1, 1:-1, 1:-1]
+                is_min &= costs <= neighbour
+
+        order = np.argsort(costs, axis=None, kind="stable")
+        order = order[np.isfinite(costs.ravel()[order])]
+        order = np.concatenate([order[is_min.ravel()[order]], order[~is_min.ravel()[order]]])[:k]
+        idx = np.unravel_index(order, costs.shape)
+        return np.stack([axes[a][idx[a]] for a in range(3)], axis=1)
+
+    @staticmethod
+    def _nested_fit_rng(seed, *key):
+        """
+        Args:
+            seed (int): root seed of the sweep.
+            key (int): indices identifying the fit, e.g. the start of the outer window and of the nested window.
+        Returns:
+            np.random.Generator with a stream that depends only on `seed` and `key`
+        """
+        return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=tuple(int(k) for k in key)))
+
+    def _get_init_limits(self, obs):
+        """
+        Args:
+            obs (Mx2 numpy array): the observed data
+        Returns:
+            [(tc_min, tc_max), (m_min, m_max), (w_min, w_max)] to draw random seeds from.
+        """
+        t1 = obs[0, 0]
+        t2 = obs[0, -1]
+        # @TODO make configurable
+        return [
+            (t2 - 0.2 * (t2 - t1), t2 + 0.2 * (t2 - t1)),  # tc
+            (0.1, 1.0),  # m
+            (6.0, 13.0),  # ω
+        ]
+
+    def estimate_params(self, observations, seed, minimizer, stats=None):
         """
         Args:
             observations (np.ndarray):  the observed time-series data.
             seed (list):  time-critical, omega, and m.
             minimizer (str):  See list of valid methods to pass to scipy.optimize.minimize:
                 https://docs.scipy.org/doc/scipy/reference/generated/scipy.optimize.minimize.html#scipy.optimize.minimize
+                Methods in GRADIENT_MINIMIZERS use the analytic gradient func_restricted_jac.
+            stats (dict): if given, the number of objective evaluations is added to stats["nfev"].
         Returns:
             tc, m, w, a, b, c, c1, c2
         """
+        from scipy.optimize import minimize
 
         cofs = minimize(
-            args=observations, fun=self.func_restricted, x0=seed, method=minimizer
+            args=observations,
+            fun=self.func_restricted,
+            x0=seed,
+            method=minimizer,
+            jac=self.func_restricted_jac if minimizer in GRADIENT_MINIMIZERS else None,
         )
+        if stats is not None:
+            stats["nfev"] += cofs.nfev
 
         if cofs.success:
             tc = cofs.x[0]
@@ -196,15 +1308,15 @@ class LPPLS(object):
         Returns:
             nothing, should plot the fit
         """
+        from matplotlib import pyplot as plt
+
         tc, m, w, a, b, c, c1, c2 = self.coef_.values()
-        time_ord = [
-            pd.Timestamp.fromordinal(d) for d in self.observations[0, :].astype("int32")
-        ]
+        time_ord = self._ordinals_to_dates(self.observations[0, :])
         t_obs = self.observations[0, :]
         # ts = pd.to_datetime(t_obs*10**9)
         # compatible_date = np.array(ts, dtype=np.datetime64)
 
-        lppls_fit = [self.lppls(t, tc, m, w, a, b, c1, c2) for t in t_obs]
+        lppls_fit = self.lppls(np.asarray(t_obs, dtype=np.float64), tc, m, w, a, b, c1, c2)
         price = self.observations[1, :]
 
         first = t_obs[0]
@@ -235,123 +1347,117 @@ class LPPLS(object):
         # fig.autofmt_xdate()
 
     def compute_indicators(self, res, filter_conditions_config=None):
-        pos_lst = []
-        neg_lst = []
-        pos_conf_lst = []
-        neg_conf_lst = []
-        price = []
-        ts = []
-        _fits = []
-
+        """
+        Args:
+            res (list, np.ndarray): result of mp_compute_nested_fits, either the list of dicts or the
+                structured array returned with as_array=True.
+            filter_conditions_config (dict): conditions a fit must satisfy to count as qualified, see
+                DEFAULT_FILTER_CONDITIONS for the keys; missing keys fall back to the defaults. To evaluate
+                several configurations in one pass, map a name to each configuration, e.g.
+                {"strict": {"O_min": 3.0}, "loose": {"D_min": 0.3}}, which yields the columns
+                pos_conf_strict, neg_conf_strict, pos_conf_loose and neg_conf_loose.
+        Returns:
+            pd.DataFrame with time, price, pos_conf and neg_conf (or the named columns), plus _fits holding
+            the nested fit dicts annotated with is_qualified when `res` is a list of dicts.
+        """
         if filter_conditions_config is None:
-            # TODO make configurable again!
-            m_min, m_max = (0.0, 1.0)
-            w_min, w_max = (2.0, 15.0)
-            O_min = 2.5
-            D_min = 0.5
-        else:
-            # TODO parse user provided conditions
-            pass
-
-        for r in res:
-            ts.append(r["t2"])
-            price.append(r["p2"])
-            pos_qual_count = 0
-            neg_qual_count = 0
-            pos_count = 0
-            neg_count = 0
-            # _fits.append(r['res'])
-
-            for idx, fits in enumerate(r["res"]):
-                t1 = fits["t1"]
-                t2 = fits["t2"]
-                tc = fits["tc"]
-                m = fits["m"]
-                w = fits["w"]
-                b = fits["b"]
-                c = fits["c"]
-                O = fits["O"]
-                D = fits["D"]
-
-                # t_delta = t2 - t1
-                # pct_delta_min = t_delta * 0.5
-                # pct_delta_max = t_delta * 0.5
-                # tc_min = t2 - pct_delta_min
-                # tc_max = t2 + pct_delta_max
-
-                # [max(t2 - 60, t2 - 0.5 * (t2 - t1)), min(252, t2 + 0.5 * (t2 - t1))]
-
-                # print('lb: max({}, {})={}'.format(t2 - 60, t2 - 0.5 * (t2 - t1), max(t2 - 60, t2 - 0.5 * (t2 - t1))))
-                # print('ub: min({}, {})={}'.format(t2 + 252, t2 + 0.5 * (t2 - t1), min(t2 + 252, t2 + 0.5 * (t2 - t1))))
-                #
-                # print('{} < {} < {}'.format(max(t2 - 60, t2 - 0.5 * (t2 - t1)), tc, min(t2 + 252, t2 + 0.5 * (t2 - t1))))
-                # print('______________')
-
-                tc_in_range = (
-                    max(t2 - 60, t2 - 0.5 * (t2 - t1))
-                    < tc
-                    < min(t2 + 252, t2 + 0.5 * (t2 - t1))
-                )
-                m_in_range = m_min < m < m_max
-                w_in_range = w_min < w < w_max
+            filter_conditions_config = {}
 
-                if b != 0 and c != 0:
-                    O = O
-                else:
-                    O = np.inf
-
-                O_in_range = O > O_min
-                D_in_range = D > D_min  # if m > 0 and w > 0 else False
-
-                if (
-                    tc_in_range
-                    and m_in_range
-                    and w_in_range
-                    and O_in_range
-                    and D_in_range
-                ):
-                    is_qualified = True
-                else:
-                    is_qualified = False
-
-                if b < 0:
-                    pos_count += 1
-                    if is_qualified:
-                        pos_qual_count += 1
-                if b > 0:
-                    neg_count += 1
-                    if is_qualified:
-                        neg_qual_count += 1
-                # add this to res to make life easier
-                r["res"][idx]["is_qualified"] = is_qualified
-
-            _fits.append(r["res"])
+        if filter_conditions_config and all(isinstance(v, dict) for v in filter_conditions_config.values()):
+            configs = filter_conditions_config
+        else:
+            configs = {None: filter_conditions_config}
 
-            pos_conf = pos_qual_count / pos_count if pos_count > 0 else 0
-            neg_conf = neg_qual_count / neg_count if neg_count > 0 else 0
-            pos_conf_lst.append(pos_conf)
-            neg_conf_lst.append(neg_conf)
+        if isinstance(res, np.ndarray):
+            fits = res
+            ts = fits["t2"][:, 0] if fits.shape[1] else np.zeros(len(fits))
+            price = fits["p2"][:, 0] if fits.shape[1] else np.zeros(len(fits))
+        else:
+            fits = self._nested_fits_to_array(res)
+            ts = [r["t2"] for r in res]
+            price = [r["p2"] for r in res]
+
+        res_df = pd.DataFrame({"time": ts, "price": price})
+        for name, config in configs.items():
+            suffix = "" if name is None else f"_{name}"
+            is_qualified = self._qualify_fits(fits, config)
+
+            pos = fits["b"] < 0
+            neg = fits["b"] > 0
+            pos_count = pos.sum(axis=1)
+            neg_count = neg.sum(axis=1)
+            pos_qual_count = (pos & is_qualified).sum(axis=1)
+            neg_qual_count = (neg & is_qualified).sum(axis=1)
+
+            res_df["pos_conf" + suffix] = np.divide(
+                pos_qual_count, pos_count, out=np.zeros(len(fits)), where=pos_count > 0
+            )
+            res_df["neg_conf" + suffix] = np.divide(
+                neg_qual_count, neg_count, out=np.zeros(len(fits)), where=neg_count > 0
+            )
 
-            # pos_lst.append(pos_count / (pos_count + neg_count))
-            # neg_lst.append(neg_count / (pos_count + neg_count))
+            if not isinstance(res, np.ndarray):
+                # add this to res to make life easier
+                for r, qualified in zip(res, is_qualified.tolist()):
+                    for fit, q in zip(r["res"], qualified):
+                        fit["is_qualified" + suffix] = q
 
-            # tc_lst.append(tc_cnt)
-            # m_lst.append(m_cnt)
-            # w_lst.append(w_cnt)
-            # O_lst.append(O_cnt)
-            # D_lst.append(D_cnt)
+        if not isinstance(res, np.ndarray):
+            res_df["_fits"] = [r["res"] for r in res]
+        return res_df
 
-        res_df = pd.DataFrame(
-            {
-                "time": ts,
-                "price": price,
-                "pos_conf": pos_conf_lst,
-                "neg_conf": neg_conf_lst,
-                "_fits": _fits,
-            }
-        )
+    def compute_multiscale_indicators(self, res, filter_conditions_config=None):
+        """
+        Args:
+            res (dict): result of mp_compute_multiscale_fits.
+            filter_conditions_config (dict): see compute_indicators.
+        Returns:
+            pd.DataFrame with time, price and the confidence columns of compute_indicators for every scale,
+            suffixed with its window size, e.g. pos_conf_120 and neg_conf_120
+        """
+        res_df = None
+        for window_size, fits in res.items():
+            indicators = self.compute_indicators(fits, filter_conditions_config)
+            if res_df is None:
+                res_df = indicators[["time", "price"]].copy()
+            for column in indicators.columns.drop(["time", "price"]):
+                res_df[f"{column}_{window_size}"] = indicators[column].to_numpy()
         return res_df
-        # return ts, price, pos_lst, neg_lst, pos_conf_lst, neg_conf_lst, #tc_lst, m_lst, w_lst, O_lst, D_lst
+
+    @staticmethod
+    def _qualify_fits(fits, filter_conditions_config):
+        """
+        Args:
+            fits (np.ndarray): structured array of NESTED_FIT_DTYPE
+            filter_conditions_config (dict): see DEFAULT_FILTER_CONDITIONS
+        Returns:
+            boolean np.ndarray with the shape of `fits`, True where the fit is qualified
+        """
+        unknown = set(filter_conditions_config) - set(DEFAULT_FILTER_CONDITIONS)
+        if unknown:
+            raise ValueError(f"Unknown filter conditions: {sorted(unknown)}")
+        conditions = {**DEFAULT_FILTER_CONDITIONS, **filter_conditions_config}
+
+        t1 = fits["t1"]
+        t2 = fits["t2"]
+        tc = fits["tc"]
+        m = fits["m"]
+        w = fits["w"]
+        b = fits["b"]
+        c = fits["c"]
+        D = fits["D"]
+
+        with np.errstate(invalid="ignore"):
+            tc_in_range = (
+                np.maximum(t2 - conditions["tc_days_before"], t2 - conditions["tc_pct"] * (t2 - t1)) < tc
+            ) & (tc < np.minimum(t2 + conditions["tc_days_after"], t2 + conditions["tc_pct"] * (t2 - t1)))
+            m_in_range = (conditions["m_min"] < m) & (m < conditions["m_max"])
+            w_in_range = (conditions["w_min"] < w) & (w < conditions["w_max"])
+            O = np.where((b != 0) & (c != 0), fits["O"], np.inf)
+            O_in_range = O > conditions["O_min"]
+            D_in_range = D > conditions["D_min"]
+
+        return tc_in_range & m_in_range & w_in_range & O_in_range & D_in_range
 
     def plot_confidence_indicators(self, res):
         """
@@ -362,11 +1468,12 @@ class LPPLS(object):
         Returns:
             nothing, should plot the indicator
         """
+        from matplotlib import pyplot as plt
+
         res_df = self.compute_indicators(res)
         fig, (ax1, ax2) = plt.subplots(nrows=2, ncols=1, sharex=True, figsize=(18, 10))
 
-        ord = res_df["time"].astype("int32")
-        ts = [pd.Timestamp.fromordinal(d) for d in ord]
+        ts = self._ordinals_to_dates(res_df["time"])
 
         # plot pos bubbles
         ax1_0 = ax1.twinx()
@@ -435,34 +1542,549 @@ class LPPLS(object):
         inner_increment=2,
         max_searches=25,
         filter_conditions_config={},
+        minimizer="Nelder-Mead",
+        shared_memory=False,
+        as_array=False,
+        warm_start=False,
+        seed=None,
+        cache=None,
+        grid=None,
+        stats=False,
+        budget=None,
+        chunksize=None,
+        granularity="window",
+        checkpoint=None,
+        checkpoint_interval=60.0,
+        writer=None,
     ):
+        """
+        Args:
+            workers (int): number of worker processes.
+            window_size (int): number of observations in each outer window.
+            smallest_window_size (int): number of observations in the smallest nested window.
+            outer_increment (int): step between consecutive outer windows.
+            inner_increment (int): step between consecutive nested windows.
+            max_searches (int): passed to fit for every nested window.
+            filter_conditions_config (dict): unused, see compute_indicators.
+            minimizer (str): passed to fit for every nested window.
+            shared_memory (bool): place the observations once in shared memory and send workers
+                only (start, end) indices instead of pickling a copy of every window. Results are
+                written back into a shared preallocated array.
+            as_array (bool): return the nested fits as a structured array instead of a list of dicts.
+            warm_start (bool): start each nested fit from the solution of the next larger nested window
+                of the same outer window, falling back to random seeds when it does not converge.
+            seed (int): makes the sweep reproducible. Each (outer window, nested window) draws its random
+                seeds from an independent np.random.SeedSequence stream keyed by its start indices, so results
+                do not depend on the number of workers or on how windows are distributed among them.
+            cache (fit_cache.FitCache): persistent store of nested fits keyed by a hash of each outer window's
+                observations and the fit configuration. Cached windows are not refitted; new ones are added.
+            grid (int, tuple): passed to fit for every nested window, see LPPLS.fit.
+            stats (bool): keep the fit statistics aggregated per outer window in self.fit_stats, see
+                nested_fit_stats. They are recorded in the wall_time, searches, nfev and status fields of the
+                structured result either way.
+            budget (dict): adaptive search budget passed to fit for every nested window, see LPPLS.fit. With
+                skip_after (int), once that many nested windows of an outer window, from the largest down, all
+                failed the remaining nested windows are not fitted and get status "skipped".
+            chunksize (int): number of tasks sent to a worker at once. Defaults to spreading the tasks over
+                about four chunks per worker. Tasks are dispatched unordered and put back in place by index,
+                so a slow window does not hold up the others.
+            granularity (str): "window" makes one task per outer window, "slice" one task per nested window
+                for a finer load balance. "slice" cannot be combined with warm_start or budget skip_after,
+                which chain the nested windows of an outer window.
+            checkpoint (str): path of a file the completed outer windows are written to while the sweep runs.
+                Restarted with the same observations and configuration, the sweep loads it and only fits the
+                windows that are missing. A checkpoint of another configuration is ignored and replaced.
+            checkpoint_interval (float): minimum number of seconds between checkpoint writes.
+            writer (result_io.NestedFitWriter): receives the nested fits of every outer window as writer.write(row,
+                fits), fitted windows as soon as they are done and cached or checkpointed ones up front.
+        Returns:
+            list of {"t1", "t2", "p2", "res": [dict, ...]}, one per outer window, or with `as_array`
+            a structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested)
+        """
+        options = {"warm_start": warm_start, "seed": seed, "grid": grid, "budget": budget}
+        fit_args = (window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options)
+        backend = functools.partial(
+            self._pool_compute_nested_fits, workers, use_shared_memory=shared_memory, chunksize=chunksize,
+            granularity=granularity,
+        )
+        res = self._run_nested_fits(backend, fit_args, cache, stats, checkpoint, checkpoint_interval, writer)
+        if as_array:
+            self.indicator_result = res
+        else:
+            obs = self.observations
+            ends = np.arange(window_size - 1, len(obs[0]), outer_increment)
+            windows = np.stack([obs[0][ends - window_size + 1], obs[0][ends], obs[1][ends]], axis=1)
+            self.indicator_result = self._nested_fits_to_dicts(res, windows)
+        return self.indicator_result
+
+    def _run_nested_fits(self, backend, fit_args, cache=None, stats=False, checkpoint=None, checkpoint_interval=60.0, writer=None):
+        """
+        Driver of the nested fit sweeps over all outer windows of self.observations: takes the windows it can
+        from the cache and the checkpoint, has the backend fit the others and records them.
+        Args:
+            backend (callable): called as backend(starts, fit_args, on_window) with the starts of the outer
+                windows to fit, returns their nested fits as a structured np.ndarray of NESTED_FIT_DTYPE with
+                shape (len(starts), n_nested) and calls on_window(k, fits), if not None, as soon as the k-th
+                outer window is complete. See _pool_compute_nested_fits.
+            fit_args (tuple): window_size, smallest_window_size, outer_increment, inner_increment,
+                max_searches, minimizer, options as passed to the nested fit workers.
+            cache, stats, checkpoint, checkpoint_interval, writer: see mp_compute_nested_fits.
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested)
+        """
+        window_size, smallest_window_size, outer_increment, inner_increment = fit_args[:4]
         obs_copy = self.observations
-        obs_opy_len = len(obs_copy[0]) - window_size
-        func = self._func_compute_nested_fits
-
-        # print('obs_copy', obs_copy)
-        # print('obs_opy_len', obs_opy_len)
-
-        func_arg_map = [
-            (
-                obs_copy[:, i : window_size + i],
-                window_size,
-                i,
-                smallest_window_size,
-                outer_increment,
-                inner_increment,
-                max_searches,
-            )
-            for i in range(0, obs_opy_len + 1, outer_increment)
+        starts = list(range(0, len(obs_copy[0]) - window_size + 1, outer_increment))
+
+        blocks = [None] * len(starts)
+        if cache is not None:
+            keys = [self._nested_fit_cache_key(obs_copy[:, i : window_size + i], fit_args, i) for i in starts]
+            blocks = [cache.get(key) for key in keys]
+        ckpt = self._load_nested_fit_checkpoint(checkpoint, checkpoint_interval, starts, fit_args)
+        if ckpt is not None:
+            blocks = [ckpt.res[row] if block is None and ckpt.done[row] else block for row, block in enumerate(blocks)]
+        todo = [row for row, block in enumerate(blocks) if block is None]
+        on_window = self._nested_fit_sink(blocks, todo, ckpt, writer)
+
+        computed = backend([starts[row] for row in todo], fit_args, on_window) if todo else []
+        if ckpt is not None:
+            ckpt.flush()
+
+        for row, block in zip(todo, computed):
+            blocks[row] = block
+            if cache is not None:
+                cache.put(keys[row], block)
+
+        res = self._stack_nested_fit_blocks(blocks, window_size, smallest_window_size, inner_increment)
+        if stats:
+            self.fit_stats = self.nested_fit_stats(res)
+        return res
+
+    def _nested_fit_cache_key(self, obs, fit_args, n_iter):
+        """
+        Args:
+            obs (np.ndarray): 2xM observations of the outer window.
+            fit_args (tuple): window_size, smallest_window_size, outer_increment, inner_increment,
+                max_searches, minimizer, options as passed to the nested fit workers.
+            n_iter (int): start of the outer window, only part of the key for seeded sweeps.
+        Returns:
+            (str) hex digest identifying the nested fits of this window under this configuration
+        """
+        window_size, smallest_window_size, _, inner_increment, max_searches, minimizer, options = fit_args
+        settings = {k: v for k, v in vars(self).items() if isinstance(v, (bool, int, float, str))}
+        init = options.get("init")
+        config = [
+            type(self).__name__,
+            NESTED_FIT_DTYPE.names,
+            sorted(settings.items()),
+            window_size,
+            smallest_window_size,
+            inner_increment,
+            max_searches,
+            minimizer,
+            options.get("warm_start", False),
+            None if init is None else [float(v) for v in init],
         ]
+        if options.get("seed") is not None:
+            # seeded streams are keyed by position, so identical windows at other positions differ
+            config += [options["seed"], list(options.get("seed_key", ())), int(n_iter)]
+        if options.get("grid") is not None:
+            config += ["grid", options["grid"]]
+        if options.get("budget") is not None:
+            config += ["budget", sorted(options["budget"].items())]
+
+        digest = hashlib.sha256(np.ascontiguousarray(obs, dtype=np.float64).tobytes())
+        digest.update(repr(config).encode())
+        return digest.hexdigest()
+
+    def _load_nested_fit_checkpoint(self, path, interval, starts, fit_args):
+        """
+        Returns:
+            _NestedFitCheckpoint of the sweep over the outer windows at `starts`, holding the windows completed
+            by an earlier run of the same configuration, or None without a path
+        """
+        if path is None:
+            return None
+        window_size, smallest_window_size, outer_increment, inner_increment = fit_args[:4]
+        n_nested = len(range(0, window_size - smallest_window_size, inner_increment))
+        key = hashlib.sha256(self._nested_fit_cache_key(self.observations, fit_args, 0).encode())
+        key.update(repr([outer_increment, starts]).encode())
+        ckpt = _NestedFitCheckpoint(path, key.hexdigest(), (len(starts), n_nested), interval)
+        ckpt.load()
+        return ckpt
 
-        with Pool(processes=workers) as pool:
-            self.indicator_result = list(
-                tqdm(pool.imap(func, func_arg_map), total=len(func_arg_map))
+    @staticmethod
+    def _nested_fit_sink(blocks, todo, ckpt, writer):
+        """
+        Passes the outer windows that are not fitted again to the writer, and returns the callback that adds
+        each fitted one to the checkpoint and the writer.
+        Args:
+            blocks (list): nested fits per outer window, None for the windows still to fit.
+            todo (list): indices into blocks of the windows to fit, in the order they are dispatched.
+            ckpt (_NestedFitCheckpoint): or None.
+            writer (result_io.NestedFitWriter): or None.
+        Returns:
+            on_window(k, fits) for the k-th window of todo, or None when there is nothing to record
+        """
+        if writer is not None:
+            for row, block in enumerate(blocks):
+                if block is not None:
+                    writer.write(row, block)
+        if ckpt is None and writer is None:
+            return None
+
+        def on_window(k, fits):
+            if ckpt is not None:
+                ckpt.add(todo[k], fits)
+            if writer is not None:
+                writer.write(todo[k], fits)
+
+        return on_window
+
+    def _pool_compute_nested_fits(
+        self, workers, starts, fit_args, on_window=None, use_shared_memory=False, chunksize=None, granularity="window"
+    ):
+        """
+        Pool backend of mp_compute_nested_fits, see _run_nested_fits. Each worker receives the model and fit_args once on
+        start-up and tasks are only (row, start, first nested index, end nested index) tuples. With
+        use_shared_memory the observations are copied once into a shared block instead of being sent with
+        the model, and workers write their fits into a shared preallocated array.
+        Args:
+            on_window (callable): called as on_window(row, fits) as soon as all nested windows of the outer
+                window at starts[row] are fitted.
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (len(starts), n_nested)
+        """
+        from tqdm import tqdm
+
+        tasks, res_shape = self._nested_fit_tasks(starts, fit_args, granularity)
+        chunksize = self._nested_fit_chunksize(len(tasks), workers, chunksize)
+        remaining = np.bincount([task[0] for task in tasks], minlength=len(starts))
+
+        model = copy.copy(self)
+        model.indicator_result = []
+        model.fit_stats = None
+
+        if not use_shared_memory:
+            res = np.zeros(res_shape, dtype=NESTED_FIT_DTYPE)
+            with Pool(processes=workers, initializer=_init_nested_fits, initargs=(model, fit_args)) as pool:
+                for row, lo, block in tqdm(pool.imap_unordered(_nested_fit_task, tasks, chunksize=chunksize), total=len(tasks)):
+                    res[row, lo : lo + len(block)] = block
+                    remaining[row] -= 1
+                    if on_window is not None and not remaining[row]:
+                        on_window(row, res[row])
+            return res
+
+        obs = np.ascontiguousarray(self.observations, dtype=np.float64)
+        model.observations = None
+        obs_shm = shared_memory.SharedMemory(create=True, size=obs.nbytes)
+        res_shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(res_shape)) * NESTED_FIT_DTYPE.itemsize, 1))
+        try:
+            np.ndarray(obs.shape, dtype=np.float64, buffer=obs_shm.buf)[:] = obs
+            res = np.ndarray(res_shape, dtype=NESTED_FIT_DTYPE, buffer=res_shm.buf)
+            res[:] = 0
+
+            initargs = (model, fit_args, obs_shm.name, obs.shape, res_shm.name, res_shape)
+            with Pool(processes=workers, initializer=_init_nested_fits, initargs=initargs) as pool:
+                for row, _, _ in tqdm(pool.imap_unordered(_nested_fit_task, tasks, chunksize=chunksize), total=len(tasks)):
+                    remaining[row] -= 1
+                    if on_window is not None and not remaining[row]:
+                        on_window(row, res[row])
+
+            result = res.copy()
+            del res
+        finally:
+            obs_shm.close()
+            obs_shm.unlink()
+            res_shm.close()
+            res_shm.unlink()
+        return result
+
+    @staticmethod
+    def _nested_fit_tasks(starts, fit_args, granularity="window"):
+        """
+        Returns:
+            list of (row, start, lo, hi) tasks fitting the nested windows lo..hi-1 of the outer window at
+            `start`, and the (len(starts), n_nested) shape of the result
+        """
+        window_size, smallest_window_size, _, inner_increment, _, _, options = fit_args
+        n_nested = len(range(0, window_size - smallest_window_size, inner_increment))
+
+        assert granularity in ("window", "slice"), f"Expected granularity to be 'window' or 'slice', got :{granularity}"
+        if granularity == "slice":
+            assert not options.get("warm_start") and (options.get("budget") or {}).get("skip_after") is None, (
+                "granularity='slice' cannot be combined with warm_start or budget skip_after"
             )
+            tasks = [(row, i, k, k + 1) for row, i in enumerate(starts) for k in range(n_nested)]
+        else:
+            tasks = [(row, i, 0, n_nested) for row, i in enumerate(starts)]
+        return tasks, (len(starts), n_nested)
+
+    @staticmethod
+    def _nested_fit_chunksize(n_tasks, workers, chunksize=None):
+        """
+        Returns:
+            chunksize, defaulting to about four chunks per worker
+        """
+        if chunksize is None:
+            chunksize, extra = divmod(n_tasks, workers * 4)
+            chunksize += 1 if extra else 0
+        return max(chunksize, 1)
 
+    def nested_fits(
+        self,
+        executor=None,
+        window_size=80,
+        smallest_window_size=20,
+        outer_increment=5,
+        inner_increment=2,
+        max_searches=25,
+        minimizer="Nelder-Mead",
+        warm_start=False,
+        seed=None,
+        cache=None,
+        grid=None,
+        stats=False,
+        budget=None,
+        chunksize=None,
+        granularity="window",
+        checkpoint=None,
+        checkpoint_interval=60.0,
+        writer=None,
+        workers=None,
+    ):
+        """
+        Nested fits on any concurrent.futures.Executor, e.g. a long-lived pool shared with other jobs.
+        With a ThreadPoolExecutor the workers read the observations in place and nothing is pickled;
+        the compiled kernels release the GIL, so minimizer="numba" fits run in parallel. With a
+        ProcessPoolExecutor each chunk of tasks is sent with a copy of the model without its
+        observations and only the outer windows it needs.
+        Args:
+            executor (concurrent.futures.Executor): runs the chunks of tasks. None fits them in this process.
+            chunksize (int): number of tasks per submitted chunk. Defaults to about four chunks per worker.
+            workers (int): number of workers of the executor, only used for the default chunksize. Defaults to
+                the executor's max_workers, or os.cpu_count() for executors without one, and to 1 without executor.
+            window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer,
+            warm_start, seed, cache, grid, stats, budget, granularity, checkpoint, checkpoint_interval, writer:
+                see mp_compute_nested_fits.
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested), the same as
+            mp_compute_nested_fits(as_array=True)
+        """
+        options = {"warm_start": warm_start, "seed": seed, "grid": grid, "budget": budget}
+        fit_args = (window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options)
+        backend = functools.partial(
+            self._executor_compute_nested_fits, executor, workers=workers, chunksize=chunksize, granularity=granularity
+        )
+        self.indicator_result = self._run_nested_fits(backend, fit_args, cache, stats, checkpoint, checkpoint_interval, writer)
         return self.indicator_result
 
+    def _executor_compute_nested_fits(self, executor, starts, fit_args, on_window=None, workers=None, chunksize=None, granularity="window"):
+        """
+        Executor backend of nested_fits, see _run_nested_fits. Each chunk of tasks carries the outer windows it needs.
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (len(starts), n_nested)
+        """
+        from tqdm import tqdm
+
+        window_size = fit_args[0]
+        obs = self.observations
+        tasks, res_shape = self._nested_fit_tasks(starts, fit_args, granularity)
+        remaining = np.bincount([task[0] for task in tasks], minlength=len(starts))
+        tasks = [(row, i, lo, hi, obs[:, i : window_size + i]) for row, i, lo, hi in tasks]
+        if workers is None:
+            workers = 1 if executor is None else getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+        chunksize = self._nested_fit_chunksize(len(tasks), workers, chunksize)
+        chunks = [tasks[k : k + chunksize] for k in range(0, len(tasks), chunksize)]
+
+        model = copy.copy(self)
+        model.observations = None
+        model.indicator_result = []
+        model.fit_stats = None
+
+        res = np.zeros(res_shape, dtype=NESTED_FIT_DTYPE)
+        if executor is None:
+            done = (_nested_fit_chunk(model, fit_args, chunk) for chunk in chunks)
+        else:
+            futures = [executor.submit(_nested_fit_chunk, model, fit_args, chunk) for chunk in chunks]
+            done = (future.result() for future in as_completed(futures))
+        for results in tqdm(done, total=len(chunks)):
+            for row, lo, block in results:
+                res[row, lo : lo + len(block)] = block
+                remaining[row] -= 1
+                if on_window is not None and not remaining[row]:
+                    on_window(row, res[row])
+        return res
+
+    def mp_compute_multiscale_fits(
+        self,
+        workers,
+        scales=((80, 20),),
+        outer_increment=5,
+        inner_increment=2,
+        max_searches=25,
+        minimizer="Nelder-Mead",
+        seed=None,
+        grid=None,
+        budget=None,
+        chunksize=None,
+    ):
+        """
+        Nested fits at several window scales in one sweep. The nested windows of all scales that share the same
+        (t1, t2) are fitted once, e.g. the 40..80 observation windows common to the scales (120, 40) and (80, 20).
+        Every scale is evaluated on the same outer windows, ending at the observations
+        max_window_size - 1, max_window_size - 1 + outer_increment, ...
+        Args:
+            workers (int): number of worker processes.
+            scales (list): (window_size, smallest_window_size) per scale, with distinct window sizes.
+            outer_increment, inner_increment, max_searches, minimizer, grid: see mp_compute_nested_fits.
+            seed (int): makes the sweep reproducible; each (t1, t2) window draws its random seeds from a stream
+                keyed by its indices, so the fits differ from seeded single scale sweeps.
+            budget (dict): see mp_compute_nested_fits, skip_after is not supported.
+            chunksize (int): number of right edges sent to a worker at once, see mp_compute_nested_fits.
+        Returns:
+            dict mapping each window_size to a structured np.ndarray of NESTED_FIT_DTYPE with shape
+            (n_windows, n_nested), the format of mp_compute_nested_fits(as_array=True)
+        """
+        from tqdm import tqdm
+
+        assert budget is None or budget.get("skip_after") is None, "budget skip_after is not supported for multiscale fits"
+        ends, windows, index = self._multiscale_windows(len(self.observations[0]), scales, outer_increment, inner_increment)
+
+        # group the unique windows by their right edge, one task each
+        los = {}
+        for lo, hi in windows:
+            los.setdefault(hi, []).append(lo)
+        tasks = list(los.items())
+        chunksize = self._nested_fit_chunksize(len(tasks), workers, chunksize)
+
+        model = copy.copy(self)
+        model.indicator_result = []
+        model.fit_stats = None
+        fit_args = (max_searches, minimizer, {"seed": seed, "grid": grid, "budget": budget})
+
+        fits = {}
+        with Pool(processes=workers, initializer=_init_nested_fits, initargs=(model, fit_args)) as pool:
+            for hi, task_los, block in tqdm(pool.imap_unordered(_multiscale_fit_task, tasks, chunksize=chunksize), total=len(tasks)):
+                for lo, record in zip(task_los, block):
+                    fits[(lo, hi)] = record
+
+        records = np.array([fits[window] for window in windows], dtype=NESTED_FIT_DTYPE)
+        return {window_size: records[idx] for window_size, idx in index.items()}
+
+    @staticmethod
+    def _multiscale_windows(n_obs, scales, outer_increment, inner_increment):
+        """
+        Args:
+            n_obs (int): number of observations.
+            scales, outer_increment, inner_increment: see mp_compute_multiscale_fits.
+        Returns:
+            ends: right edges (exclusive) of the outer windows shared by all scales,
+            windows: the unique (lo, hi) windows to fit,
+            index: window_size to an int np.ndarray of shape (len(ends), n_nested) indexing into windows
+        """
+        window_sizes = [window_size for window_size, _ in scales]
+        assert len(set(window_sizes)) == len(window_sizes), f"Expected distinct window sizes, got :{window_sizes}"
+        ends = range(max(window_sizes, default=0), n_obs + 1, outer_increment)
+
+        windows = {}
+        index = {}
+        for window_size, smallest_window_size in scales:
+            nested_starts = range(0, window_size - smallest_window_size, inner_increment)
+            idx = np.zeros((len(ends), len(nested_starts)), dtype=np.int64)
+            for row, hi in enumerate(ends):
+                for col, j in enumerate(nested_starts):
+                    idx[row, col] = windows.setdefault((hi - window_size + j, hi), len(windows))
+            index[window_size] = idx
+        return list(ends), list(windows), index
+
+    @staticmethod
+    def _stack_nested_fit_blocks(blocks, window_size, smallest_window_size, inner_increment):
+        n_nested = len(range(0, window_size - smallest_window_size, inner_increment))
+        if not blocks:
+            return np.zeros((0, n_nested), dtype=NESTED_FIT_DTYPE)
+        return np.stack(blocks)
+
+    @staticmethod
+    def nested_fit_stats(res, per_window=True):
+        """
+        Args:
+            res (np.ndarray): structured array of NESTED_FIT_DTYPE with shape (n_windows, n_nested), e.g. from
+                mp_compute_nested_fits(as_array=True).
+            per_window (bool): aggregate the nested fits of each outer window into one row.
+        Returns:
+            pd.DataFrame with one row per outer window (t1, t2, fits, failed, wall_time, max_wall_time,
+            searches, nfev and a count per FIT_STATUS), or with one row per nested fit (window, t1, t2,
+            wall_time, searches, nfev, status) when per_window is False
+        """
+        status = pd.Categorical.from_codes(res["status"].astype(np.int64).ravel(), categories=FIT_STATUS)
+        fits = pd.DataFrame(
+            {
+                "window": np.repeat(np.arange(res.shape[0]), res.shape[1]),
+                "t1": res["t1"].ravel(),
+                "t2": res["t2"].ravel(),
+                "wall_time": res["wall_time"].ravel(),
+                "searches": res["searches"].ravel().astype(np.int64),
+                "nfev": res["nfev"].ravel().astype(np.int64),
+                "status": status,
+            }
+        )
+        if not per_window:
+            return fits
+
+        windows = pd.DataFrame(
+            {
+                "t1": res["t1"][:, 0] if res.shape[1] else np.zeros(res.shape[0]),
+                "t2": res["t2"][:, 0] if res.shape[1] else np.zeros(res.shape[0]),
+                "fits": res.shape[1],
+                "failed": (res["status"] != 0).sum(axis=1),
+                "wall_time": res["wall_time"].sum(axis=1),
+                "max_wall_time": res["wall_time"].max(axis=1, initial=0.0),
+                "searches": res["searches"].sum(axis=1).astype(np.int64),
+                "nfev": res["nfev"].sum(axis=1).astype(np.int64),
+            }
+        )
+        for code, name in enumerate(FIT_STATUS):
+            windows[name] = (res["status"] == code).sum(axis=1)
+        return windows
+
+    @staticmethod
+    def _nested_fits_to_dicts(res, windows=None):
+        """
+        Args:
+            res (np.ndarray): structured array of NESTED_FIT_DTYPE with shape (n_windows, n_nested)
+            windows (np.ndarray): (n_windows, 3) t1, t2 and p2 of each outer window. Defaults to those of the
+                largest nested window, which requires n_nested > 0.
+        Returns:
+            list of {"t1", "t2", "p2", "res": [dict, ...]}, the format returned by mp_compute_nested_fits
+        """
+        if windows is None:
+            assert res.shape[1] > 0 or not len(res), "Expected the outer windows when there are no nested windows"
+            windows = [(block["t1"][0], block["t2"][0], block["p2"][0]) for block in res]
+        fields = list(NESTED_FIT_FIELDS)
+        result = []
+        for block, (t1, t2, p2) in zip(res, windows):
+            fits = block[fields].tolist()
+            result.append({"t1": t1, "t2": t2, "p2": p2, "res": [dict(zip(NESTED_FIT_FIELDS, f)) for f in fits]})
+        return result
+
+    @staticmethod
+    def _nested_fits_to_array(res):
+        """
+        Args:
+            res (list): result of mp_compute_nested_fits in the list of dicts format
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested)
+        """
+        n_nested = max((len(r["res"]) for r in res), default=0)
+        arr = np.zeros((len(res), n_nested), dtype=NESTED_FIT_DTYPE)
+        for i, r in enumerate(res):
+            for j, fits in enumerate(r["res"]):
+                for k in NESTED_FIT_FIELDS:
+                    arr[k][i, j] = fits[k]
+                arr["p2"][i, j] = r["p2"]
+        return arr
+
     def compute_nested_fits(
         self,
         window_size=80,
@@ -470,40 +2092,202 @@ class LPPLS(object):
         outer_increment=5,
         inner_increment=2,
         max_searches=25,
+        minimizer="Nelder-Mead",
+        as_array=False,
+        warm_start=False,
+        seed=None,
+        cache=None,
+        grid=None,
+        stats=False,
+        budget=None,
     ):
+        """
+        Serial counterpart of mp_compute_nested_fits.
+        Args:
+            as_array (bool): return a structured np.ndarray of NESTED_FIT_DTYPE with shape
+                (n_windows, n_nested), the same as mp_compute_nested_fits(as_array=True),
+                instead of an xr.DataArray.
+            warm_start (bool): start each nested fit from the solution of the next larger nested
+                window, and the largest nested window from the solution of the previous outer window.
+            seed (int): see mp_compute_nested_fits.
+            cache (fit_cache.FitCache): see mp_compute_nested_fits.
+            grid (int, tuple): see mp_compute_nested_fits.
+            stats (bool): see mp_compute_nested_fits.
+            budget (dict): see mp_compute_nested_fits.
+        Returns:
+            xr.DataArray with dims ("t2", "windowsizes", "params") or a structured np.ndarray
+        """
+        import xarray as xr
+
         obs_copy = self.observations
         obs_copy_len = len(obs_copy[0]) - window_size
-        window_delta = window_size - smallest_window_size
-        res = []
-        i_idx = 0
+
+        blocks = []
+        init = None
         for i in range(0, obs_copy_len + 1, outer_increment):
-            j_idx = 0
             obs = obs_copy[:, i : window_size + i]
-            t1 = obs[0][0]
-            t2 = obs[0][-1]
-            res.append([])
-            i_idx += 1
-            for j in range(0, window_delta, inner_increment):
-                obs_shrinking_slice = obs[:, j:window_size]
-                tc, m, w, a, b, c, _, _, _, _ = self.fit(
-                    max_searches, obs=obs_shrinking_slice
-                )
-                res[i_idx - 1].append([])
-                j_idx += 1
-                for k in [t2, t1, a, b, c, m, 0, tc]:
-                    res[i_idx - 1][j_idx - 1].append(k)
+            options = {"warm_start": warm_start, "init": init, "seed": seed, "grid": grid, "budget": budget}
+            fit_args = (window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options)
+            block = None
+            if cache is not None:
+                key = self._nested_fit_cache_key(obs, fit_args, i)
+                block = cache.get(key)
+            if block is None:
+                block = self._func_compute_nested_fit_block((obs, window_size, i) + fit_args[1:])
+                if cache is not None:
+                    cache.put(key, block)
+            if warm_start and len(block) and block["tc"][0] != 0:
+                init = (block["tc"][0], block["m"][0], block["w"][0])
+            blocks.append(block)
+        res = self._stack_nested_fit_blocks(blocks, window_size, smallest_window_size, inner_increment)
+        if stats:
+            self.fit_stats = self.nested_fit_stats(res)
+        if as_array:
+            return res
+
+        # t1 is the start of the outer window for every nested fit
+        params = ["t2", "t1", "a", "b", "c", "m", "0", "tc"]
+        columns = {k: res[k] for k in params if k in res.dtype.names}
+        columns["t1"] = np.broadcast_to(res["t1"][:, :1], res.shape)
+        columns["0"] = np.zeros(res.shape)
+        data = np.stack([columns[k] for k in params], axis=-1)
         return xr.DataArray(
-            data=res,
+            data=data,
             dims=("t2", "windowsizes", "params"),
             coords=dict(
-                t2=obs_copy[0][(window_size - 1) :],
+                t2=obs_copy[0][(window_size - 1) :: outer_increment],
                 windowsizes=range(smallest_window_size, window_size, inner_increment),
-                params=["t2", "t1", "a", "b", "c", "m", "0", "tc"],
+                params=params,
             ),
         )
 
-    def _func_compute_nested_fits(self, args):
+    def nb_compute_nested_fits(
+        self,
+        window_size=80,
+        smallest_window_size=20,
+        outer_increment=5,
+        inner_increment=2,
+        max_searches=25,
+        seed=None,
+        threads=None,
+    ):
+        """
+        Compiled counterpart of compute_nested_fits(minimizer="numba", as_array=True): a single numba kernel fits
+        every nested window, with the outer windows spread over the threads of this process, so there are no
+        worker processes to start or feed. Only the random seeds are drawn in Python, up front; with `seed` they
+        come from the same streams as in compute_nested_fits, so both return the same fits.
+        Args:
+            window_size, smallest_window_size, outer_increment, inner_increment, max_searches: see
+                mp_compute_nested_fits.
+            seed (int): see mp_compute_nested_fits.
+            threads (int): number of threads, defaults to numba's NUMBA_NUM_THREADS (the number of cores).
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested). The wall_time of each fit
+            is the wall time of the sweep divided by the number of fits.
+        """
+        assert self._has_compiled_objective(), (
+            f"nb_compute_nested_fits fits the least squares or quantile loss only, not the objective of {type(self).__name__}"
+        )
+        start = time.perf_counter()
+        t = np.ascontiguousarray(self.observations[0], dtype=np.float64)
+        p = np.ascontiguousarray(self.observations[1], dtype=np.float64)
+        starts = np.arange(0, len(t) - window_size + 1, outer_increment, dtype=np.int64)
+        nested_starts = np.arange(0, window_size - smallest_window_size, inner_increment, dtype=np.int64)
+        seeds = self._nested_fit_seeds(starts, window_size, nested_starts, max_searches, seed)
+
+        with _fork_safe_threading_layer():
+            n_threads = get_num_threads()
+            if threads is not None:
+                set_num_threads(threads)
+            try:
+                params, nfev, status = _nested_fit_sweep(
+                    t, p, starts, window_size, nested_starts, seeds, 600, 1e-4, 1e-4, self._compiled_loss_q()
+                )
+            finally:
+                set_num_threads(n_threads)
+
+        res = np.zeros(params.shape[:2], dtype=NESTED_FIT_DTYPE)
+        for k, name in enumerate(("tc", "m", "w", "a", "b", "c1", "c2")):
+            res[name] = params[..., k]
+        res["t1"] = t[starts[:, None] + nested_starts]
+        res["t2"] = t[starts + window_size - 1][:, None]
+        res["p2"] = p[starts + window_size - 1][:, None]
+
+        # get_c, get_oscillations and get_damping of the converged fits
+        converged = status == 0
+        tc, m, w, b, c1, c2 = (res[name] for name in ("tc", "m", "w", "b", "c1", "c2"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            res["c"] = np.where((c1 != 0) & (c2 != 0), c1 / np.cos(np.arctan(c2 / c1)), 0.0)
+            O = (w / (2.0 * np.pi)) * np.log((tc - res["t1"]) / (tc - res["t2"]))
+            D = (m * np.abs(b)) / (w * np.abs(res["c"]))
+        res["O"] = np.where(converged, O, 0.0)
+        res["D"] = np.where(converged, D, 0.0)
+
+        res["searches"] = max_searches
+        res["nfev"] = nfev
+        res["status"] = status
+        res["wall_time"] = (time.perf_counter() - start) / max(res.size, 1)
+        self.indicator_result = res
+        return res
+
+    def _has_compiled_objective(self):
+        """
+        Returns:
+            (bool) whether the compiled kernels fit the objective of this model: it keeps the objective and the fit of
+            LPPLS, or declares the compiled loss matching its own with _compiled_loss_q, as QLPPLS does
+        """
+        cls = type(self)
+        if cls._compiled_loss_q is not LPPLS._compiled_loss_q:
+            return True
+        return all(getattr(cls, name) is getattr(LPPLS, name) for name in ("func_restricted", "estimate_params", "fit"))
+
+    def _nested_fit_seeds(self, starts, window_size, nested_starts, max_searches, seed=None):
+        """
+        Args:
+            starts (np.ndarray): starts of the outer windows.
+            window_size (int): number of observations in each outer window.
+            nested_starts (np.ndarray): starts of the nested windows within an outer window.
+            max_searches (int): number of seeds per nested window.
+            seed (int): draw the seeds of each nested window from its _nested_fit_rng stream, as the nested fits do.
+        Returns:
+            (n_windows x n_nested x max_searches x 3) np.ndarray of random (tc, m, w) within _get_init_limits
+        """
+        seeds = np.empty((len(starts), len(nested_starts), max_searches, 3))
+        rng = np.random.default_rng() if seed is None else None
+        for row, i in enumerate(starts):
+            for col, j in enumerate(nested_starts):
+                obs = self.observations[:, i + j : i + window_size]
+                seeds[row, col] = self._draw_seeds(obs, max_searches, rng if seed is None else self._nested_fit_rng(seed, i, j))
+        return seeds
 
+    def _func_compute_nested_fits(self, args):
+        obs = args[0]
+        block = self._func_compute_nested_fit_block(args)
+        # return {'t1': self.ordinal_to_date(t1), 't2': self.ordinal_to_date(t2), 'p2': p2, 'res': res}
+        return {
+            "t1": obs[0][0],
+            "t2": obs[0][-1],
+            "p2": obs[1][-1],
+            "res": [dict(zip(NESTED_FIT_FIELDS, fits)) for fits in block[list(NESTED_FIT_FIELDS)].tolist()],
+        }
+
+    def _func_compute_nested_fit_block(self, args):
+        """
+        Fits every nested window of one outer window.
+        Args:
+            args (tuple): obs, window_size, n_iter, smallest_window_size, outer_increment,
+                inner_increment, max_searches, minimizer and optionally a dict of options:
+                    warm_start (bool): seed each nested fit with the previous nested solution.
+                    init (tuple): (tc, m, w) to seed the largest nested window with.
+                    seed (int): root seed; every nested fit then draws its random seeds from an
+                        independent stream keyed by (*seed_key, n_iter, nested start).
+                    seed_key (tuple): extra leading ints of the stream key, e.g. to tell symbols apart.
+                    grid (int, tuple): grid pre-search passed to fit, see LPPLS.fit.
+                    budget (dict): adaptive search budget passed to fit, see mp_compute_nested_fits.
+                    slices (tuple): (lo, hi) to fit only the nested windows lo..hi-1, largest first.
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with one element per nested window
+        """
         (
             obs,
             window_size,
@@ -512,82 +2296,85 @@ class LPPLS(object):
             outer_increment,
             inner_increment,
             max_searches,
-        ) = args
+            minimizer,
+        ) = args[:8]
+        options = args[8] if len(args) > 8 else {}
+        warm_start = options.get("warm_start", False)
+        init = options.get("init")
+        seed = options.get("seed")
+        seed_key = options.get("seed_key", ())
+        grid = options.get("grid")
+        budget = options.get("budget")
+        fit_budget = None if budget is None else {k: v for k, v in budget.items() if k != "skip_after"}
+        skip_after = None if budget is None else budget.get("skip_after")
+        any_converged = False
 
         window_delta = window_size - smallest_window_size
-
-        res = []
-
-        # print('obs', obs)
-        t1 = obs[0][0]
-        t2 = obs[0][-1]
-        p1 = obs[1][0]
-        p2 = obs[1][-1]
-
-        # if self.scale_obs:
-        #     t1 = self.inverse_transform_observations([[t1, p1]])[0, 0]
-        #     t2 = self.inverse_transform_observations([[t2, p2]])[0, 0]
-        #     p1 = self.inverse_transform_observations([[t1, p1]])[0, 1]
-        #     p2 = self.inverse_transform_observations([[t2, p2]])[0, 1]
-
-        # tc_init_min, tc_init_max = self._get_tc_bounds(obs_shrinking_slice, tc_min, tc_max)
-        #
-        # tc_in_range = last - tc_init_min < tc < last + tc_init_max
-        # m_in_range = m_min < m < m_max
-        # w_in_range = w_min < w < w_max
-        # O_in_range = self._is_O_in_range(tc, w, last, O_min)
-        # D_in_range = self._is_D_in_range(m, w, b, c, D_min)
-        #
-        # qualified[value] = tc_in_range and m_in_range and w_in_range and O_in_range and D_in_range
-
-        # run n fits on the observation slice.
-        for j in range(0, window_delta, inner_increment):
+        nested_starts = range(0, window_delta, inner_increment)
+        if options.get("slices") is not None:
+            nested_starts = nested_starts[slice(*options["slices"])]
+        block = np.zeros(len(nested_starts), dtype=NESTED_FIT_DTYPE)
+        # all nested windows share the right edge, so one grid scored with suffix sums seeds all of them
+        grid_seeds = None if grid is None else self._nested_grid_seeds(obs[:, :window_size], grid, nested_starts, max_searches)
+
+        # run n fits on the observation slice, from the largest nested window to the smallest so
+        # that warm starts move between neighbouring windows.
+        for idx, j in enumerate(nested_starts):
             obs_shrinking_slice = obs[:, j:window_size]
 
             # fit the model to the data and get back the params
-            if self.__class__.__name__ == "LPPLSCMAES":
-                # print('cmaes fit is running!')
-                tc, m, w, a, b, c, c1, c2, O, D = self.fit(
-                    max_iteration=2500, pop_size=4, obs=obs_shrinking_slice
-                )
+            stats = {}
+            if skip_after is not None and idx >= skip_after and not any_converged:
+                # every larger nested window failed, the smaller ones are not worth the search budget
+                params = (0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+                stats.update(wall_time=0.0, searches=0, nfev=0, status="skipped")
             else:
-                tc, m, w, a, b, c, c1, c2, O, D = self.fit(
-                    max_searches, obs=obs_shrinking_slice
+                params = self._fit_nested_window(
+                    obs_shrinking_slice,
+                    max_searches,
+                    minimizer,
+                    init=init if warm_start else None,
+                    rng=None if seed is None else self._nested_fit_rng(seed, *seed_key, n_iter, j),
+                    grid=grid if grid_seeds is None else grid_seeds[idx],
+                    budget=fit_budget,
+                    stats=stats,
                 )
+                if warm_start and params[0] != 0:
+                    init = params[:3]
+            any_converged = any_converged or stats["status"] == "converged"
 
-            nested_t1 = obs_shrinking_slice[0][0]
-            nested_t2 = obs_shrinking_slice[0][-1]
-            nested_p1 = obs_shrinking_slice[1][0]
-            nested_p2 = obs_shrinking_slice[1][-1]
-
-            # TODO consider rescaling data to be ∈ [0, 1] for perf?
-            # if self.scale_obs:
-            #     sub_t1 = self.inverse_transform_observations([[sub_t1, sub_p1]])[0, 0]
-            #     sub_t2 = self.inverse_transform_observations([[sub_t2, sub_p2]])[0, 0]
-            #     tc = self.inverse_transform_observations([[tc, 0]])[0, 0]
-
-            res.append(
-                {
-                    # "tc_d": self.ordinal_to_date(tc),
-                    "tc": tc,
-                    "m": m,
-                    "w": w,
-                    "a": a,
-                    "b": b,
-                    "c": c,
-                    "c1": c1,
-                    "c2": c2,
-                    # "t1_d": self.ordinal_to_date(nested_t1),
-                    # "t2_d": self.ordinal_to_date(nested_t2),
-                    "t1": nested_t1,
-                    "t2": nested_t2,
-                    "O": O,
-                    "D": D,
-                }
-            )
+            block[idx] = self._nested_fit_record(params, obs_shrinking_slice, stats)
 
-        # return {'t1': self.ordinal_to_date(t1), 't2': self.ordinal_to_date(t2), 'p2': p2, 'res': res}
-        return {"t1": t1, "t2": t2, "p2": p2, "res": res}
+        return block
+
+    def _fit_nested_window(self, obs, max_searches, minimizer, init=None, rng=None, grid=None, budget=None, stats=None):
+        """
+        Fits one nested window, with the CMA-ES settings for LPPLSCMAES.
+        Args:
+            obs (np.ndarray): 2xM observations of the nested window.
+            max_searches, minimizer, init, rng, grid, budget, stats: see LPPLS.fit.
+        Returns:
+            tc, m, w, a, b, c, c1, c2, O, D
+        """
+        if self.__class__.__name__ == "LPPLSCMAES":
+            # print('cmaes fit is running!')
+            return self.fit(max_iteration=2500, pop_size=4, obs=obs, stats=stats)
+        return self.fit(
+            max_searches, minimizer=minimizer, obs=obs, init=init, rng=rng, grid=grid, stats=stats, budget=budget
+        )
+
+    @staticmethod
+    def _nested_fit_record(params, obs, stats):
+        """
+        Returns:
+            tuple of the NESTED_FIT_DTYPE fields of a nested fit of `obs` with result `params` and fit statistics `stats`
+        """
+        return tuple(params) + (obs[0][0], obs[0][-1], obs[1][-1]) + (
+            stats["wall_time"],
+            stats["searches"],
+            stats["nfev"],
+            FIT_STATUS.index(stats["status"]),
+        )
 
     def _get_tc_bounds(self, obs, lower_bound_pct, upper_bound_pct):
         """
@@ -626,6 +2413,16 @@ class LPPLS(object):
         else:
             return 0
 
+    @staticmethod
+    def _ordinals_to_dates(ordinals):
+        """
+        Vectorized pd.Timestamp.fromordinal of the whole days in `ordinals`.
+        Returns:
+            pd.DatetimeIndex
+        """
+        days = np.asarray(ordinals, dtype=np.float64).astype(np.int64) - EPOCH_ORDINAL
+        return pd.DatetimeIndex(days.astype("datetime64[D]"))
+
     def ordinal_to_date(self, ordinal):
         # Since pandas represents timestamps in nanosecond resolution,
         # the time span that can be represented using a 64-bit integer
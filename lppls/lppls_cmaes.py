@@ -1,8 +1,35 @@
 import cma as cm
-from lppls.lppls import LPPLS
+from lppls.lppls import LPPLS, _solve_linear_params
 # import multiprocessing as mp
+from numba import njit
 import numpy as np
-from scipy.stats import chisquare
+import time
+
+
+@njit(nogil=True, cache=True)
+def _chisquare_population(t, p, xs):
+    """
+    CMA-ES objective of every candidate (tc, m, w) in xs at once: the chi-square statistic of the
+    fitted LPPLS against the observations, with nan or inf model values set to zero.
+    Returns:
+        np.ndarray with one error per row of xs
+    """
+    errors = np.zeros(xs.shape[0])
+    for k in range(xs.shape[0]):
+        tc, m, w = xs[k, 0], xs[k, 1], xs[k, 2]
+        ok, a, b, c1, c2 = _solve_linear_params(t, p, tc, m, w)
+        if not ok:
+            a, b, c1, c2 = 0.0, 0.0, 0.0, 0.0
+        error = 0.0
+        for i in range(len(t)):
+            dt = np.abs(tc - t[i]) + 1e-8
+            phase = w * np.log(dt)
+            res = a + dt ** m * (b + c1 * np.cos(phase) + c2 * np.sin(phase))
+            if not np.isfinite(res):
+                res = 0.0
+            error += (res - p[i]) ** 2 / p[i]
+        errors[k] = error
+    return errors
 
 
 class LPPLSCMAES(LPPLS):
@@ -22,28 +49,26 @@ class LPPLSCMAES(LPPLS):
         Returns:
             float: error of the objective function
         """
-        tc, m, w = x
-        try:
-            rM = super().matrix_equation(obs, tc, m, w)
-            a, b, c1, c2 = rM[:, 0].tolist()
-        except Exception as e:
-            a, b, c1, c2 = 0, 0, 0, 0
-            print(e)
-
-        t = obs[0, :]
-        res = super().lppls(t, tc, m, w, a, b, c1, c2)
-
+        return self.fun_restricted_population([x], obs)[0]
 
+    def fun_restricted_population(self, xs, obs):
+        """
+        Objective function of a whole CMA-ES population in one compiled call
 
-        # make nan or inf to zero
-        res[np.isnan(res)] = 0.
-        res[np.isinf(res)] = 0.
+        Args:
+            xs (List): candidates (tc, m, w), e.g. the output of es.ask()
+            obs (np.ndarray): 2xM observations
 
-        # calculate the chi square
-        error, _ = chisquare(f_obs=res, f_exp=obs[1, :])
-        return error
+        Returns:
+            np.ndarray: error of the objective function per candidate
+        """
+        return _chisquare_population(
+            np.ascontiguousarray(obs[0, :], dtype=np.float64),
+            np.ascontiguousarray(obs[1, :], dtype=np.float64),
+            np.asarray(xs, dtype=np.float64).reshape(-1, 3),
+        )
 
-    def fit(self, max_iteration=1000, factor_sigma=0.1, pop_size=1, obs=None):
+    def fit(self, max_iteration=1000, factor_sigma=0.1, pop_size=1, obs=None, verbose=False, log=False, stats=None):
         """
         Runs the optimazation loop
 
@@ -53,6 +78,9 @@ class LPPLSCMAES(LPPLS):
             pop_size (int, optional): population size for CMA ES
             cores (int, optional): number of parallel runs
             obs ():
+            verbose (bool, optional): print the CMA-ES progress every iteration
+            log (bool, optional): write the CMA-ES data to disc (outcmaes/) to be plotted
+            stats (dict, optional): filled as in LPPLS.fit, with one search per CMA-ES run
         Returns:
             [List]: all optimized and calculated values for tc, m, w, a, b, c, c1, c2
         """
@@ -60,6 +88,11 @@ class LPPLSCMAES(LPPLS):
         if obs is None:
             obs = self.observations
 
+        start = time.perf_counter()
+        if stats is None:
+            stats = {}
+        stats.update(wall_time=0.0, searches=1, nfev=0, status="no_convergence", failures={})
+
         # best guess of the starting values
         m = 0.5
         w = 9.
@@ -73,22 +106,32 @@ class LPPLSCMAES(LPPLS):
         opts.set('CMA_stds', [factor_sigma * tc, factor_sigma * (0.9 - 0.1), factor_sigma * (13. - 6.)])
         opts.set('bounds', [(tc, 0.1, 6.), (np.inf, 0.9, 13.)])
         opts.set('popsize', 10 * 2 ** pop_size)
+        if not verbose:
+            opts.set('verbose', -9)
+            opts.set('verb_disp', 0)
+        if not log:
+            opts.set('verb_log', 0)
 
         es = cm.CMAEvolutionStrategy(x0=[tc, m, w], sigma0=1., inopts=opts)
 
         # here we go
         while not es.stop() and es.countiter <= max_iteration:
             solutions = es.ask()
-            solution = [self.fun_restricted(s, obs) for s in solutions]
-            es.tell(solutions, solution)
-            es.logger.add()  # write data to disc to be plotted
-            es.disp()
+            solution = self.fun_restricted_population(solutions, obs)
+            es.tell(solutions, solution.tolist())
+            if log:
+                es.logger.add()  # write data to disc to be plotted
+            if verbose:
+                es.disp()
 
         # after while loop print infos and plot the final
         # es.result_pretty()
         # cm.plot()
         # plt.savefig('cmaes.png', dpi=300)
 
+        stats["nfev"] = es.countevals
+        stats["wall_time"] = time.perf_counter() - start
+
         # get best results
         t1 = obs[0, 0]
         t2 = obs[0, -1]
@@ -100,6 +143,7 @@ class LPPLSCMAES(LPPLS):
             except Exception as e:
                 a, b, c1, c2 = 0, 0, 0, 0
                 print(e)
+                self._record_failure(stats, "linalg_error")
 
             c = self.get_c(c1, c2)
 
@@ -110,6 +154,9 @@ class LPPLSCMAES(LPPLS):
             O = self.get_oscillations(w, tc, t1, t2)
             D = self.get_damping(m, w, b, c)
 
+            if not stats["failures"]:
+                stats["status"] = "converged"
             return tc, m, w, a, b, c, c1, c2, O, D
         else:
+            self._record_failure(stats, "no_convergence")
             return 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
@@ -1,37 +1,64 @@
 import numpy as np
 from scipy.optimize import least_squares
-from lppls.lppls import LPPLS
+from lppls.lppls import LPPLS, _lppls_residuals, _lppls_residual_jacobian
 
 
 class LPPLS_LM(LPPLS):
     
     def func_restricted(self, x, obs):
-        tc = x[0]
-        m = x[1]
-        w = x[2]
-
-        rM = self.matrix_equation(obs, tc, m, w)
-        a, b, c1, c2 = rM[:, 0].tolist()
-
-        delta = [self.lppls(t, tc, m, w, a, b, c1, c2) for t in obs[0, :]]
-        residuals = np.subtract(delta, obs[1, :])
+        """
+        Residuals of the LPPLS model with the linear params profiled out, computed in one compiled pass.
+        Args:
+            x (np.ndarray): tc, m, w
+            obs (np.ndarray): 2xM observations
+        Returns:
+            (np.ndarray) model minus observed values
+        """
+        ok, residuals = _lppls_residuals(
+            np.ascontiguousarray(obs[0, :], dtype=np.float64),
+            np.ascontiguousarray(obs[1, :], dtype=np.float64),
+            x[0], x[1], x[2],
+        )
+        if not ok:
+            raise np.linalg.LinAlgError("Singular matrix")
         return residuals  # return the array of residuals
+
+    def func_restricted_jac(self, x, obs):
+        """
+        Analytic Jacobian of func_restricted with respect to (tc, m, w), accounting for the profiled linear params.
+        Returns:
+            (np.ndarray) Mx3
+        """
+        ok, jac = _lppls_residual_jacobian(
+            np.ascontiguousarray(obs[0, :], dtype=np.float64),
+            np.ascontiguousarray(obs[1, :], dtype=np.float64),
+            x[0], x[1], x[2],
+        )
+        if not ok:
+            raise np.linalg.LinAlgError("Singular matrix")
+        return jac
         
-    def estimate_params(self, observations, seed, minimizer=None):
+    def estimate_params(self, observations, seed, minimizer=None, stats=None):
         """
         Overrides the estimate_params method to use least_squares with 'lm' method.
         Args:
             observations (np.ndarray): The observed time-series data.
             seed (list): Initial guess for time-critical, omega, and m.
+            stats (dict): if given, the number of objective evaluations is added to stats["nfev"].
         Returns:
             tc, m, w, a, b, c, c1, c2
         """
-        # Define a wrapper function for least_squares
+        # Define wrapper functions for least_squares
         def wrapper(x):
             return self.func_restricted(x, observations)
 
+        def jac_wrapper(x):
+            return self.func_restricted_jac(x, observations)
+
         # Use least_squares with the Levenberg-Marquardt method
-        result = least_squares(wrapper, seed, method='lm')
+        result = least_squares(wrapper, seed, jac=jac_wrapper, method='lm')
+        if stats is not None:
+            stats["nfev"] += result.nfev
 
         if result.success:
             tc, m, w = result.x
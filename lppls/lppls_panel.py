@@ -0,0 +1,155 @@
+from multiprocessing import Pool
+import zlib
+from lppls.data_loader import to_ordinal
+from lppls.lppls import LPPLS, NESTED_FIT_DTYPE
+import numpy as np
+import pandas as pd
+
+# per-process state of the panel workers, set once by _init_panel_worker
+_panel_state = {}
+
+
+def _init_panel_worker(model, observations, fit_args):
+    _panel_state["model"] = model
+    _panel_state["observations"] = observations
+    _panel_state["fit_args"] = fit_args
+
+
+def _seed_key(symbol):
+    return (zlib.crc32(str(symbol).encode()),)
+
+
+def _panel_nested_fits(task):
+    symbol, row, start, lo, hi = task
+    window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options = _panel_state["fit_args"]
+    options = dict(options, seed_key=_seed_key(symbol), slices=(lo, hi))
+    obs = _panel_state["observations"][symbol][:, start : start + window_size]
+    block = _panel_state["model"]._func_compute_nested_fit_block(
+        (obs, window_size, start, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, options)
+    )
+    return symbol, row, lo, block
+
+
+class LPPLSPanel(object):
+
+    def __init__(self, panel, model=None):
+        """
+        Args:
+            panel (pd.DataFrame, dict): either a wide DataFrame with one column of observed values per symbol
+                (a DatetimeIndex is converted to ordinals, any other index is used as the time axis as is),
+                or a dict mapping each symbol to a 2xM observations array. Missing values are dropped per symbol.
+            model (LPPLS): instance used for fitting, e.g. a QLPPLS. Defaults to a plain LPPLS.
+        """
+        assert isinstance(
+            panel, (pd.DataFrame, dict)
+        ), f"Expected panel to be <pd.DataFrame> or <dict>, got :{type(panel)}"
+
+        if isinstance(panel, pd.DataFrame):
+            if isinstance(panel.index, pd.DatetimeIndex):
+                time = to_ordinal(panel.index)
+            else:
+                time = panel.index.to_numpy(dtype=np.float64)
+            observations = {}
+            for symbol in panel.columns:
+                values = panel[symbol].to_numpy(dtype=np.float64)
+                mask = ~np.isnan(values)
+                observations[symbol] = np.array([time[mask], values[mask]])
+        else:
+            observations = {symbol: np.asarray(obs, dtype=np.float64) for symbol, obs in panel.items()}
+
+        self.observations = observations
+        self.model = model if model is not None else LPPLS(np.zeros((2, 0)))
+        self.fits = {}
+
+    def scan(
+        self,
+        workers,
+        window_size=80,
+        smallest_window_size=20,
+        outer_increment=5,
+        inner_increment=2,
+        max_searches=25,
+        minimizer="Nelder-Mead",
+        filter_conditions_config=None,
+        chunksize=None,
+        seed=None,
+        cache=None,
+        granularity="window",
+    ):
+        """
+        Computes the nested fits of every symbol in a single worker pool and the confidence indicators per symbol.
+        Tasks of all symbols are interleaved and dispatched unordered, so a slow symbol does not hold up the pool.
+        Args:
+            workers (int): number of worker processes.
+            window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer:
+                see LPPLS.mp_compute_nested_fits.
+            filter_conditions_config (dict): see LPPLS.compute_indicators.
+            chunksize (int): number of tasks sent to a worker at once. Defaults to spreading the tasks over
+                about four chunks per worker.
+            seed (int): see LPPLS.mp_compute_nested_fits. The random streams are additionally keyed by symbol.
+            cache (fit_cache.FitCache): see LPPLS.mp_compute_nested_fits. Windows found in the cache are not
+                sent to the pool.
+            granularity (str): "window" or "slice", see LPPLS.mp_compute_nested_fits. With "slice" every nested
+                window is a task of its own, so a long outer window does not hold up a worker.
+        Returns:
+            dict of symbol -> pd.DataFrame in the format of LPPLS.compute_indicators. The nested fits are kept in
+            self.fits as symbol -> structured np.ndarray of NESTED_FIT_DTYPE.
+        """
+        fit_args = (window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer, {"seed": seed})
+
+        starts = {
+            symbol: list(range(0, obs.shape[1] - window_size + 1, outer_increment))
+            for symbol, obs in self.observations.items()
+        }
+        blocks = {symbol: [None] * len(s) for symbol, s in starts.items()}
+        keys = {}
+        if cache is not None:
+            for symbol, symbol_starts in starts.items():
+                obs = self.observations[symbol]
+                symbol_fit_args = fit_args[:-1] + (dict(fit_args[-1], seed_key=_seed_key(symbol)),)
+                for row, i in enumerate(symbol_starts):
+                    keys[symbol, row] = self.model._nested_fit_cache_key(obs[:, i : i + window_size], symbol_fit_args, i)
+                    blocks[symbol][row] = cache.get(keys[symbol, row])
+
+        # the windows still to fit per symbol, with their tasks as in LPPLS.mp_compute_nested_fits
+        todo, computed, remaining, symbol_tasks = {}, {}, {}, {}
+        for symbol, symbol_starts in starts.items():
+            todo[symbol] = [row for row, block in enumerate(blocks[symbol]) if block is None]
+            tasks, res_shape = LPPLS._nested_fit_tasks([symbol_starts[row] for row in todo[symbol]], fit_args, granularity)
+            computed[symbol] = np.zeros(res_shape, dtype=NESTED_FIT_DTYPE)
+            remaining[symbol] = np.bincount([task[0] for task in tasks], minlength=len(todo[symbol]))
+            symbol_tasks[symbol] = [(symbol,) + task for task in tasks]
+
+        # round-robin over symbols so that every chunk mixes symbols of different lengths
+        tasks = []
+        for k in range(max((len(t) for t in symbol_tasks.values()), default=0)):
+            tasks += [t[k] for t in symbol_tasks.values() if k < len(t)]
+
+        chunksize = LPPLS._nested_fit_chunksize(len(tasks), workers, chunksize)
+
+        if tasks:
+            from tqdm import tqdm
+
+            with Pool(
+                processes=workers,
+                initializer=_init_panel_worker,
+                initargs=(self.model, self.observations, fit_args),
+            ) as pool:
+                for symbol, k, lo, block in tqdm(
+                    pool.imap_unordered(_panel_nested_fits, tasks, chunksize=chunksize), total=len(tasks)
+                ):
+                    computed[symbol][k, lo : lo + len(block)] = block
+                    remaining[symbol][k] -= 1
+                    if not remaining[symbol][k]:
+                        row = todo[symbol][k]
+                        blocks[symbol][row] = computed[symbol][k]
+                        if cache is not None:
+                            cache.put(keys[symbol, row], blocks[symbol][row])
+
+        indicators = {}
+        for symbol, symbol_blocks in blocks.items():
+            self.fits[symbol] = self.model._stack_nested_fit_blocks(
+                symbol_blocks, window_size, smallest_window_size, inner_increment
+            )
+            indicators[symbol] = self.model.compute_indicators(self.fits[symbol], filter_conditions_config)
+        return indicators
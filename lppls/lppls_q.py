@@ -1,4 +1,4 @@
-from lppls.lppls import LPPLS
+from lppls.lppls import LPPLS, _quantile_cost, _lppls_residuals, _lppls_residual_jacobian
 import numpy as np
 
 
@@ -22,14 +22,29 @@ class QLPPLS(LPPLS):
         w = x[2]
         observations = args[0]
 
-        rM = self.matrix_equation(observations, tc, m, w)
-        a, b, c1, c2 = rM[:, 0].tolist()
-
-        delta = [self.lppls(t, tc, m, w, a, b, c1, c2) for t in observations[0, :]]
-        delta = np.subtract(delta, observations[1, :])
-
         # Use the L1 norm (sum of absolute differences) instead of the L2 norm
         # Apply the q-dependent loss function using the given quantile
-        loss = np.sum([-(1 - self.q) * e if e < 0 else self.q * e for e in np.abs(delta)])
+        return _quantile_cost(
+            np.ascontiguousarray(observations[0, :], dtype=np.float64),
+            np.ascontiguousarray(observations[1, :], dtype=np.float64),
+            tc, m, w, self.q,
+        )
 
-        return loss
\ No newline at end of file
+    def func_restricted_jac(self, x, *args):
+        """
+        Subgradient of func_restricted with respect to (tc, m, w), q * sign(delta)' J with J the
+        Jacobian of the profiled residuals.
+        Returns:
+            (np.ndarray) with shape (3,)
+        """
+        observations = args[0]
+        t = np.ascontiguousarray(observations[0, :], dtype=np.float64)
+        p = np.ascontiguousarray(observations[1, :], dtype=np.float64)
+        ok, delta = _lppls_residuals(t, p, x[0], x[1], x[2])
+        ok_jac, jac = _lppls_residual_jacobian(t, p, x[0], x[1], x[2])
+        if not (ok and ok_jac):
+            raise np.linalg.LinAlgError("Singular matrix")
+        return self.q * np.sign(delta).dot(jac)
+
+    def _compiled_loss_q(self):
+        return self.q
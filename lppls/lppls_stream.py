@@ -0,0 +1,189 @@
+from collections import deque
+from lppls.lppls import LPPLS, NESTED_FIT_DTYPE
+import numpy as np
+import pandas as pd
+
+
+class LPPLSStream(object):
+
+    def __init__(
+        self,
+        window_size=80,
+        smallest_window_size=20,
+        outer_increment=1,
+        inner_increment=2,
+        max_searches=25,
+        minimizer="numba",
+        filter_conditions_config=None,
+        model=None,
+        indicators=None,
+        warm_start=False,
+        seed=None,
+        keep_fits=0,
+        max_rows=None,
+    ):
+        """
+        Online confidence indicator. Observations are pushed one bar at a time; whenever a new outer
+        window is complete only that window and its nested windows are fitted, and one row is appended
+        to the indicator. Windows and seeds line up with mp_compute_nested_fits over the same series:
+        the stream starts at observation 0, or at the index given to prime.
+        Args:
+            window_size, smallest_window_size, outer_increment, inner_increment, max_searches, minimizer,
+            warm_start, seed: see LPPLS.compute_nested_fits.
+            filter_conditions_config (dict): see LPPLS.compute_indicators.
+            model (LPPLS): instance used for fitting, e.g. a QLPPLS. Defaults to a plain LPPLS.
+            indicators (pd.DataFrame): existing output of compute_indicators to append to, see prime.
+            keep_fits (int): number of most recent fitted windows kept for fits, 0 keeps none.
+            max_rows (int): number of most recent rows kept by indicators, None keeps all.
+        """
+        assert window_size > smallest_window_size, "window_size must be larger than smallest_window_size"
+
+        self.window_size = window_size
+        self.smallest_window_size = smallest_window_size
+        self.outer_increment = outer_increment
+        self.inner_increment = inner_increment
+        self.max_searches = max_searches
+        self.minimizer = minimizer
+        self.filter_conditions_config = filter_conditions_config
+        self.warm_start = warm_start
+        self.seed = seed
+        self.model = model if model is not None else LPPLS(np.zeros((2, 0)))
+
+        # every observation is written twice so the last window_size observations are always a
+        # contiguous slice of the buffer, without copying on read
+        self._buffer = np.zeros((2, 2 * window_size))
+        self._count = 0
+        # index of the first pushed observation in the full series, so windows keep their batch index
+        self._offset = 0
+
+        self._fits = deque(maxlen=keep_fits)
+        self._init = None
+        self._rows = []
+        self.max_rows = max_rows
+        self._indicators = indicators
+        self._indicators_len = 0 if indicators is None else len(indicators)
+
+    @property
+    def observations(self):
+        """
+        Returns:
+            2xM view of the most recent observations, M <= window_size
+        """
+        n = min(self._count, self.window_size)
+        if n == 0:
+            return self._buffer[:, :0]
+        end = (self._count - 1) % self.window_size + 1 + self.window_size
+        return self._buffer[:, end - n : end]
+
+    @property
+    def fits(self):
+        """
+        Returns:
+            structured np.ndarray of NESTED_FIT_DTYPE with shape (n_windows, n_nested) for the last
+            keep_fits windows fitted by this stream
+        """
+        if not self._fits:
+            n_nested = len(range(0, self.window_size - self.smallest_window_size, self.inner_increment))
+            return np.zeros((0, n_nested), dtype=NESTED_FIT_DTYPE)
+        return np.stack(self._fits)
+
+    def _empty_indicators(self):
+        """
+        Returns:
+            pd.DataFrame with no rows and the columns compute_indicators gives for filter_conditions_config
+        """
+        n_nested = len(range(0, self.window_size - self.smallest_window_size, self.inner_increment))
+        return self.model.compute_indicators(np.zeros((0, n_nested), dtype=NESTED_FIT_DTYPE), self.filter_conditions_config)
+
+    @property
+    def indicators(self):
+        """
+        Returns:
+            pd.DataFrame in the format of LPPLS.compute_indicators for all windows seen so far
+        """
+        self._flush_rows()
+        if self._indicators is None:
+            return self._empty_indicators()
+        return self._indicators
+
+    def _flush_rows(self):
+        if self._rows:
+            new = pd.concat(self._rows)
+            self._indicators = new if self._indicators is None else pd.concat([self._indicators, new])
+            self._rows = []
+        if self.max_rows is not None and self._indicators is not None:
+            self._indicators = self._indicators.iloc[-self.max_rows :]
+
+    def _push(self, t, price):
+        slot = self._count % self.window_size
+        self._buffer[0, slot] = self._buffer[0, slot + self.window_size] = t
+        self._buffer[1, slot] = self._buffer[1, slot + self.window_size] = price
+        self._count += 1
+
+    def prime(self, observations, start_index=0):
+        """
+        Loads history into the buffer without fitting, e.g. the series an existing indicators frame was
+        computed from. Later updates then only fit the windows that end after this history.
+        Args:
+            observations (np.ndarray): 2xM observations, only the last window_size are kept.
+            start_index (int): index of observations[:, 0] in the full series, so that windows keep the
+                outer_increment alignment and seeds of mp_compute_nested_fits over that series.
+        """
+        assert self._count == 0, "prime must be called before any observation is pushed"
+        m = observations.shape[1]
+        self._offset = start_index
+        self._count = max(m - self.window_size, 0)
+        for t, p in zip(observations[0, self._count :], observations[1, self._count :]):
+            self._push(t, p)
+
+    def update(self, t, price):
+        """
+        Args:
+            t (float): timestamp of the new observation, on the same axis as the LPPLS observations.
+            price (float): observed value.
+        Returns:
+            pd.DataFrame with the new indicator row if the observation completed an outer window, else None
+        """
+        self._push(t, price)
+
+        window_idx = self._offset + self._count - self.window_size
+        if self._count < self.window_size or window_idx % self.outer_increment != 0:
+            return None
+
+        block = self.model._func_compute_nested_fit_block(
+            (
+                self.observations,
+                self.window_size,
+                window_idx,
+                self.smallest_window_size,
+                self.outer_increment,
+                self.inner_increment,
+                self.max_searches,
+                self.minimizer,
+                {"warm_start": self.warm_start, "init": self._init, "seed": self.seed},
+            )
+        )
+        if self.warm_start and block["tc"][0] != 0:
+            self._init = (block["tc"][0], block["m"][0], block["w"][0])
+        self._fits.append(block)
+
+        row = self.model.compute_indicators(block[np.newaxis, :], self.filter_conditions_config)
+        row.index = [self._indicators_len]
+        self._indicators_len += 1
+        self._rows.append(row)
+        if self.max_rows is not None and len(self._rows) >= self.max_rows:
+            self._flush_rows()
+        return row
+
+    def extend(self, observations):
+        """
+        Pushes a 2xM array of new observations, fitting every window they complete. Use prime to load
+        history that is already covered by the indicators.
+        Returns:
+            pd.DataFrame of the indicator rows produced by these observations
+        """
+        rows = [self.update(t, p) for t, p in zip(observations[0], observations[1])]
+        rows = [r for r in rows if r is not None]
+        if not rows:
+            return self._empty_indicators()
+        return pd.concat(rows)
@@ -0,0 +1,120 @@
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, pip install lppls[parquet]
+    pa = None
+    pq = None
+
+# fields of the nested fits read by LPPLS.compute_indicators, the default columns of read_nested_fits
+INDICATOR_FIELDS = ("tc", "m", "w", "b", "c", "O", "D", "t1", "t2", "p2")
+# position of a nested fit in the sweep, written in front of its fields
+INDEX_COLUMNS = ("window", "nested")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Reading and writing Parquet requires pyarrow, install it with: pip install lppls[parquet]")
+
+
+class NestedFitWriter(object):
+
+    def __init__(self, path, row_group_size=65536):
+        """
+        Streams nested fits into a Parquet file with one row per nested fit: the indices of its outer and nested
+        window in the `window` and `nested` columns, followed by one column per field of the structured result.
+        Pass it as `writer` to LPPLS.mp_compute_nested_fits or LPPLS.nested_fits to write every outer window as
+        soon as it is fitted, or use write_nested_fits for a result in memory.
+        Args:
+            path (str): Parquet file to create, replaced if it exists.
+            row_group_size (int): number of rows buffered before they are written as one row group.
+        """
+        _require_pyarrow()
+        self.path = path
+        self.row_group_size = row_group_size
+        self._writer = None
+        self._batches = []
+        self._rows = 0
+
+    def write(self, window, fits):
+        """
+        Args:
+            window (int): index of the outer window in the sweep.
+            fits (np.ndarray): structured array with the nested fits of that outer window.
+        """
+        fits = np.asarray(fits)
+        columns = {
+            "window": np.full(len(fits), window, dtype=np.int64),
+            "nested": np.arange(len(fits), dtype=np.int64),
+        }
+        for name in fits.dtype.names:
+            columns[name] = np.ascontiguousarray(fits[name])
+        self._batches.append(pa.RecordBatch.from_pydict(columns))
+        self._rows += len(fits)
+        if self._rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._batches:
+            return
+        table = pa.Table.from_batches(self._batches)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._batches = []
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_nested_fits(path, res, row_group_size=65536):
+    """
+    Args:
+        path (str): Parquet file to create, replaced if it exists.
+        res (np.ndarray): structured array of nested fits with shape (n_windows, n_nested), e.g. the result of
+            LPPLS.mp_compute_nested_fits(as_array=True).
+        row_group_size (int): see NestedFitWriter.
+    """
+    with NestedFitWriter(path, row_group_size) as writer:
+        for window, fits in enumerate(res):
+            writer.write(window, fits)
+
+
+def read_nested_fits(path, columns=INDICATOR_FIELDS, windows=None):
+    """
+    Reads nested fits written by NestedFitWriter. Only the requested columns are read from disk, and with
+    `windows` only the row groups that can hold those outer windows.
+    Args:
+        path (str): Parquet file, or a directory of them.
+        columns (tuple): fields to read, None for all. The default reads what LPPLS.compute_indicators needs.
+        windows (tuple): (first, last) outer windows to read, last excluded. None reads all.
+    Returns:
+        structured np.ndarray with the requested fields and shape (n_windows, n_nested), rows in window order
+    """
+    _require_pyarrow()
+    if columns is not None:
+        columns = list(INDEX_COLUMNS) + [c for c in columns if c not in INDEX_COLUMNS]
+    filters = None if windows is None else [("window", ">=", windows[0]), ("window", "<", windows[1])]
+    table = pq.read_table(path, columns=columns, filters=filters)
+
+    names = [name for name in table.column_names if name not in INDEX_COLUMNS]
+    window = table["window"].to_numpy()
+    nested = table["nested"].to_numpy()
+    _, row = np.unique(window, return_inverse=True)
+    shape = (row.max() + 1 if len(row) else 0, nested.max() + 1 if len(nested) else 0)
+
+    res = np.zeros(shape, dtype=[(name, table.schema.field(name).type.to_pandas_dtype()) for name in names])
+    for name in names:
+        res[name][row, nested] = table[name].to_numpy()
+    return res
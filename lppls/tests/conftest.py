@@ -0,0 +1,24 @@
+import os
+import tempfile
+import pytest
+
+# The tests import lppls.py as the top level module `lppls`, while installed code and the benchmarks import it as
+# `lppls.lppls`. numba's on-disk cache is keyed by file, not module name, and cannot load kernels cached under the
+# other name, so the tests keep their own cache.
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "lppls-tests-numba-cache"))
+
+
+@pytest.fixture
+def sibling(monkeypatch):
+    """Imports a name from a sibling module, which refers to these modules as lppls.lppls and lppls.data_loader"""
+    import importlib
+    import sys
+    import data_loader
+    import lppls
+
+    def load(module, name):
+        monkeypatch.setitem(sys.modules, 'lppls.lppls', lppls)
+        monkeypatch.setitem(sys.modules, 'lppls.data_loader', data_loader)
+        return getattr(importlib.import_module(module), name)
+
+    return load
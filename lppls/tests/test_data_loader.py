@@ -1,5 +1,7 @@
 import data_loader
 import pytest
+import numpy as np
+import pandas as pd
 
 
 def test_nasdaq_dotcom():
@@ -8,3 +10,36 @@ def test_nasdaq_dotcom():
     actual = data.iloc[0].values.tolist()
     expected = ['1994-01-03', 774.109985, 777.289978, 768.409973, 770.760010, 770.760010, 253020000]
     assert all([a == pytest.approx(b, 1e6) for a, b in zip(actual, expected)])
+
+
+def test_to_observations():
+    data = data_loader.nasdaq_dotcom()
+    obs = data_loader.to_observations(data)
+    assert obs.shape == (2, len(data))
+    assert obs.dtype == np.float64
+    expected = [pd.Timestamp(d).toordinal() for d in data['Date']]
+    assert np.array_equal(obs[0], expected)
+    assert np.allclose(obs[1], np.log(data['Adj Close']))
+
+
+def test_to_ordinal_tz():
+    dates = pd.DatetimeIndex(['2020-01-01 23:00', '2020-01-02 01:00']).tz_localize('America/New_York')
+    expected = [d.toordinal() for d in dates]
+    assert expected == [737425, 737426]
+    assert np.array_equal(data_loader.to_ordinal(dates), expected)
+    assert np.array_equal(data_loader.to_ordinal(pd.Series(dates)), expected)
+
+
+def test_load_histories(tmp_path):
+    data = data_loader.nasdaq_dotcom()
+    data.head(50).to_csv(tmp_path / 'A.csv', index=False)
+    data.tail(30).to_csv(tmp_path / 'B.csv', index=False)
+    histories = data_loader.load_histories(str(tmp_path), workers=2)
+    assert list(histories) == ['A', 'B']
+    assert np.array_equal(histories['A'], data_loader.to_observations(data.head(50)))
+
+    # saved histories are memory-mapped on the next load
+    data_loader.save_histories(str(tmp_path / 'npy'), histories)
+    mapped = data_loader.load_histories(str(tmp_path / 'npy'))
+    assert isinstance(mapped['B'], np.memmap)
+    assert np.array_equal(mapped['B'], histories['B'])
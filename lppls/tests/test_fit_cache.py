@@ -0,0 +1,23 @@
+import fit_cache
+import numpy as np
+import pickle
+
+
+def test_fit_cache(tmp_path):
+    path = str(tmp_path / 'fits.sqlite')
+    cache = fit_cache.FitCache(path)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+    value = np.zeros(3, dtype=[('tc', np.float64), ('m', np.float64)])
+    value['tc'] = [1.0, 2.0, 3.0]
+    cache.put('a', value)
+    assert 'a' in cache
+    assert (cache.get('a') == value).all()
+    assert cache.get('a').dtype == value.dtype
+
+    # survives closing, reopening and pickling
+    cache.close()
+    cache = pickle.loads(pickle.dumps(fit_cache.FitCache(path)))
+    assert len(cache) == 1
+    assert (cache.get('a')['tc'] == [1.0, 2.0, 3.0]).all()
@@ -2,7 +2,9 @@
 
 import lppls
 import data_loader
+import fit_cache
 import pytest
+import sys
 import numpy as np
 
 
@@ -98,6 +100,401 @@ def test_mp_compute_nested_fits(observations, lppls_model):
     assert len(res[0]['res']) == 30
     assert set(res[0]['res'][0]).issubset(expected_keys)
 
+def test_mp_compute_nested_fits_no_nested_windows(observations, lppls_model):
+    res = lppls_model.mp_compute_nested_fits(workers=1, window_size=20, smallest_window_size=20, outer_increment=40)
+    assert [(r['t1'], r['t2'], r['res']) for r in res] == [(0.0, 19.0, []), (40.0, 59.0, []), (80.0, 99.0, [])]
+    assert res[2]['p2'] == observations[1, 99]
+
+def test_mp_compute_nested_fits_shared_memory(observations, lppls_model):
+    arr = lppls_model.mp_compute_nested_fits(workers=1, max_searches=5, minimizer='numba', shared_memory=True, as_array=True)
+    assert arr.shape == (5, 30)
+    assert arr['t1'][4, 29] == 78.0
+
+    res = lppls_model.mp_compute_nested_fits(workers=1, max_searches=5, shared_memory=True)
+    assert len(res) == 5
+    assert res[0]['t1'] == 0.0
+    assert res[0]['t2'] == 79.0
+    assert res[0]['p2'] == observations[1, 79]
+    assert res[4]['t1'] == 20.0
+    expected_keys = {'tc', 'm', 'w', 'a', 'b', 'c', 'c1', 'c2', 't1', 't2', 'O', 'D'}
+    assert len(res[0]['res']) == 30
+    assert set(res[0]['res'][0]) == expected_keys
+    assert res[4]['res'][29]['t1'] == 78.0
+    assert res[4]['res'][29]['t2'] == 99.0
+
+def test_compute_nested_fits_as_array(observations, lppls_model):
+    res = lppls_model.compute_nested_fits(max_searches=5, minimizer='numba', as_array=True)
+    assert res.shape == (5, 30)
+    assert res.dtype == lppls.NESTED_FIT_DTYPE
+    assert (res['t2'][0] == 79.0).all()
+    assert res['t1'][4, 0] == 20.0
+    assert (res['p2'][:, 0] == observations[1, 79:100:5]).all()
+
+    # round trip through the list of dicts format
+    dicts = lppls_model._nested_fits_to_dicts(res)
+    assert dicts[4]['t1'] == 20.0
+    assert dicts[4]['p2'] == observations[1, 99]
+    back = lppls_model._nested_fits_to_array(dicts)
+    for f in lppls.NESTED_FIT_FIELDS + ('p2',):
+        assert np.array_equal(back[f], res[f], equal_nan=True)
+
+
+def test_fit_stats(observations, lppls_model, monkeypatch):
+    obs = np.array([observations[0], np.log(observations[1])])
+    for minimizer in ['Nelder-Mead', 'numba']:
+        stats = {}
+        lppls_model.fit(5, minimizer=minimizer, obs=obs, stats=stats)
+        assert stats['status'] in lppls.FIT_STATUS
+        assert 1 <= stats['searches'] <= 5
+        assert stats['nfev'] > 0
+        assert stats['wall_time'] > 0
+        assert sum(stats['failures'].values()) <= stats['searches']
+
+    def singular(*args, **kwargs):
+        raise np.linalg.LinAlgError('Singular matrix')
+
+    with monkeypatch.context() as mp:
+        mp.setattr(lppls_model, 'estimate_params', singular)
+        stats = {}
+        assert lppls_model.fit(3, obs=obs, stats=stats) == (0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    assert stats['searches'] == 3
+    assert stats['status'] == 'linalg_error'
+    assert stats['failures'] == {'linalg_error': 3}
+
+    res = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, stats=True)
+    windows = lppls_model.fit_stats
+    assert len(windows) == res.shape[0]
+    assert (windows['fits'] == res.shape[1]).all()
+    assert (windows[list(lppls.FIT_STATUS)].sum(axis=1) == res.shape[1]).all()
+    assert (windows['nfev'] == res['nfev'].sum(axis=1)).all()
+    fits = lppls_model.nested_fit_stats(res, per_window=False)
+    assert len(fits) == res.size
+    assert set(fits['status'].astype(str)) <= set(lppls.FIT_STATUS)
+
+def test_fit_budget(observations, lppls_model, sibling, monkeypatch):
+    obs = np.array([observations[0], np.log(observations[1])])
+    stats = {}
+    early = lppls_model.fit(25, minimizer='numba', obs=obs, rng=np.random.default_rng(0), stats=stats, budget={'agree': 3})
+    assert stats['status'] == 'converged'
+    assert 3 <= stats['searches'] < 25
+    assert lppls_model.coef_['tc'] == early[0]
+    # the best of the searches that ran, the same as a plain batch of that many seeds
+    batch = lppls_model.fit(stats['searches'], minimizer='numba', obs=obs, rng=np.random.default_rng(0))
+    assert early == batch
+
+    # caps that are not hit do not change the fit
+    stats = {}
+    capped = lppls_model.fit(25, minimizer='numba', obs=obs, rng=np.random.default_rng(0), stats=stats, budget={'max_time': 100.0})
+    assert np.array_equal(capped, lppls_model.fit(25, minimizer='numba', obs=obs, rng=np.random.default_rng(0)), equal_nan=True)
+    assert stats['searches'] == 25
+
+    # every grid seed ran, so no convergence is not a budget failure
+    batch = lppls._nelder_mead_batch
+    with monkeypatch.context() as mp:
+        mp.setattr(lppls, '_nelder_mead_batch', lambda *args: batch(*args)[:3] + (np.zeros(len(args[2]), dtype=bool),))
+        stats = {}
+        lppls_model.fit(25, minimizer='numba', obs=obs, grid=(2, 2, 2), stats=stats, budget={'max_time': 100.0})
+    assert stats['searches'] == 8
+    assert stats['status'] == 'no_convergence'
+
+    for minimizer in ['Nelder-Mead', 'numba']:
+        stats = {}
+        assert lppls_model.fit(25, minimizer=minimizer, obs=obs, stats=stats, budget={'max_time': 0.0})[0] == 0
+        assert stats['status'] == 'budget_exhausted'
+        assert stats['searches'] == 0
+
+    with pytest.raises(AssertionError):
+        lppls_model.fit(5, obs=obs, budget={'max_evals': 10})
+
+    # searches are ranked by a scalar cost also when func_restricted returns residuals
+    lm = sibling('lppls_lm', 'LPPLS_LM')(obs)
+    stats = {}
+    fit = lm.fit(10, obs=obs, rng=np.random.default_rng(0), stats=stats, budget={'agree': 2})
+    assert stats['status'] == 'converged'
+    assert 2 <= stats['searches'] <= 10
+    assert lm.coef_['tc'] == fit[0]
+
+    # once the two largest nested windows fail the rest of the window is skipped
+    res = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, budget={'max_time': 0.0, 'skip_after': 2})
+    assert (res['status'][:, :2] == lppls.FIT_STATUS.index('budget_exhausted')).all()
+    assert (res['status'][:, 2:] == lppls.FIT_STATUS.index('skipped')).all()
+    assert (res['t1'][0] == np.arange(0, 60, 2)).all()
+
+
+def test_compute_indicators(lppls_model):
+    fits = np.zeros((2, 3), dtype=lppls.NESTED_FIT_DTYPE)
+    fits['t1'] = [[0.0, 10.0, 20.0], [5.0, 15.0, 25.0]]
+    fits['t2'] = [[79.0] * 3, [84.0] * 3]
+    fits['p2'] = [[1.0] * 3, [2.0] * 3]
+    fits['tc'] = 90.0
+    fits['m'] = 0.5
+    fits['w'] = 8.0
+    fits['c'] = 0.1
+    fits['O'] = 3.0
+    fits['D'] = [[0.6, 0.4, 0.6], [0.6, 0.6, 0.6]]
+    fits['b'] = [[-1.0, -1.0, 1.0], [1.0, 1.0, 0.0]]
+
+    res_df = lppls_model.compute_indicators(fits)
+    assert res_df['time'].tolist() == [79.0, 84.0]
+    assert res_df['price'].tolist() == [1.0, 2.0]
+    assert res_df['pos_conf'].tolist() == [0.5, 0.0]
+    assert res_df['neg_conf'].tolist() == [1.0, 1.0]
+
+    # several named configurations in one pass
+    res_df = lppls_model.compute_indicators(fits, {'loose': {'D_min': 0.3}, 'strict': {'O_min': 3.5}})
+    assert res_df['pos_conf_loose'].tolist() == [1.0, 0.0]
+    assert res_df['neg_conf_strict'].tolist() == [0.0, 0.0]
+
+    # the list of dicts format gives the same indicator and is annotated with is_qualified
+    dicts = lppls_model._nested_fits_to_dicts(fits)
+    res_df = lppls_model.compute_indicators(dicts)
+    assert res_df['pos_conf'].tolist() == [0.5, 0.0]
+    assert [f['is_qualified'] for f in res_df['_fits'][0]] == [True, False, True]
+
+    with pytest.raises(ValueError):
+        lppls_model.compute_indicators(fits, {'not_a_condition': 1.0})
+
+def test_compute_nested_fits(observations, lppls_model):
+    res = lppls_model.compute_nested_fits(max_searches=5, minimizer='numba')
+    assert res.shape == (5, 30, 8)
+    assert res.coords['t2'].values.tolist() == [79.0, 84.0, 89.0, 94.0, 99.0]
+    assert (res.sel(t2=99.0, params='t1') == 20.0).all()
+
+
+def test_fit_warm_start(observations, lppls_model):
+    tc, m, w, a, b, c, c1, c2, O, D = lppls_model.fit(10, minimizer='numba', rng=np.random.default_rng(0))
+    cost = lppls_model.func_restricted([tc, m, w], observations)
+    # starting from a converged solution lands on an equally good solution
+    for minimizer in ['numba', 'Nelder-Mead']:
+        warm = lppls_model.fit(1, minimizer=minimizer, init=(tc, m, w))
+        assert np.isclose(lppls_model.func_restricted(warm[:3], observations), cost, rtol=1e-4)
+
+    res = lppls_model.compute_nested_fits(max_searches=5, minimizer='numba', as_array=True, warm_start=True)
+    assert res.shape == (5, 30)
+    assert (res['tc'] != 0).all()
+
+def test_nested_fits_seed(observations, lppls_model):
+    # a seeded sweep is reproducible and independent of how windows are spread over workers
+    a = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, seed=42)
+    b = lppls_model.mp_compute_nested_fits(workers=2, max_searches=3, minimizer='numba', as_array=True, seed=42)
+    c = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, seed=43)
+    for f in set(a.dtype.names) - {'wall_time'}:
+        assert np.array_equal(a[f], b[f], equal_nan=True)
+    assert not np.array_equal(a['tc'], c['tc'])
+
+    rng = lppls_model._nested_fit_rng(42, 0, 0)
+    assert lppls_model.fit(3, minimizer='numba', obs=observations[:, :80], rng=rng)[0] == a['tc'][0, 0]
+
+def test_stream_prime(observations, lppls_model, sibling):
+    LPPLSStream = sibling('lppls_stream', 'LPPLSStream')
+    res = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', seed=7, as_array=True)
+    history = lppls_model.compute_indicators(res[:4])
+
+    # continue the indicators of the first 4 windows (the last one ends at observation 94)
+    stream = LPPLSStream(outer_increment=5, max_searches=3, indicators=history, seed=7, keep_fits=1, max_rows=4)
+    stream.prime(observations[:, 10:95], start_index=10)
+    assert np.array_equal(stream.observations, observations[:, 15:95])
+    rows = stream.extend(observations[:, 95:])
+    assert list(rows.index) == [4]
+    assert rows['time'].iloc[0] == observations[0, 99]
+    assert np.array_equal(stream.fits['tc'], res['tc'][4:], equal_nan=True)
+    assert list(stream.indicators.index) == [1, 2, 3, 4]
+    assert stream.indicators['time'].is_unique
+
+    # before the first window the frames have the columns of compute_indicators, also for named configs
+    config = {'strict': {'O_min': 3.0}, 'loose': {'D_min': 0.3}}
+    stream = LPPLSStream(outer_increment=5, max_searches=3, filter_conditions_config=config)
+    expected = lppls_model.compute_indicators(res[:1], config).columns
+    assert list(stream.indicators.columns) == list(expected)
+    assert list(stream.extend(observations[:, :10]).columns) == list(expected)
+
+
+def test_panel_scan(observations, sibling, monkeypatch, tmp_path):
+    import functools
+    import pandas as pd
+
+    LPPLSPanel = sibling('lppls_panel', 'LPPLSPanel')
+    panel_module = sys.modules['lppls_panel']
+    index = pd.date_range('2020-01-01', periods=100, freq='D', tz='America/New_York')
+    prices = pd.DataFrame({'A': np.log(observations[1]), 'B': np.log(observations[1])[::-1]}, index=index)
+    prices.iloc[:10, 1] = np.nan
+    panel = LPPLSPanel(prices)
+    assert np.array_equal(panel.observations['A'][0], data_loader.to_ordinal(index))
+    assert panel.observations['B'].shape == (2, 90)
+    assert not np.isnan(panel.observations['B']).any()
+
+    cache = fit_cache.FitCache(str(tmp_path / 'fits.sqlite'))
+    kwargs = dict(max_searches=2, minimizer='numba', seed=3, cache=cache)
+    indicators = panel.scan(1, granularity='slice', **kwargs)
+    assert set(indicators) == {'A', 'B'}
+    assert len(indicators['B']) == 3
+
+    # the same fits as a sweep over each symbol alone with the symbol-keyed seed
+    for symbol, obs in panel.observations.items():
+        model = lppls.LPPLS(obs)
+        fit_args = (80, 20, 5, 2, 2, 'numba', {'seed': 3, 'seed_key': panel_module._seed_key(symbol)})
+        expected = model._run_nested_fits(functools.partial(model._pool_compute_nested_fits, 1), fit_args)
+        for f in set(expected.dtype.names) - {'wall_time'}:
+            assert np.array_equal(panel.fits[symbol][f], expected[f], equal_nan=True), (symbol, f)
+
+    # cached windows are not sent to a pool
+    fits = panel.fits
+    monkeypatch.setattr(panel_module, 'Pool', None)
+    again = LPPLSPanel(prices)
+    again.scan(1, **kwargs)
+    for symbol in fits:
+        assert np.array_equal(again.fits[symbol]['tc'], fits[symbol]['tc'])
+
+
+def test_mp_compute_nested_fits_granularity(observations, lppls_model):
+    a = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, seed=7)
+    b = lppls_model.mp_compute_nested_fits(
+        workers=2, max_searches=3, minimizer='numba', as_array=True, seed=7, granularity='slice', chunksize=7
+    )
+    for f in set(a.dtype.names) - {'wall_time'}:
+        assert np.array_equal(a[f], b[f], equal_nan=True)
+
+    with pytest.raises(AssertionError):
+        lppls_model.mp_compute_nested_fits(workers=1, warm_start=True, granularity='slice')
+
+def test_nested_fits_executor(observations, lppls_model):
+    from concurrent.futures import ThreadPoolExecutor
+
+    a = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, seed=7)
+    b = lppls_model.nested_fits(max_searches=3, minimizer='numba', seed=7)
+    lppls_model.coef_ = {'tc': -1.0}
+    with ThreadPoolExecutor(2) as executor:
+        c = lppls_model.nested_fits(executor, max_searches=3, minimizer='numba', seed=7, granularity='slice')
+    # the workers fit on copies of the model
+    assert lppls_model.coef_ == {'tc': -1.0}
+
+    # the default chunksize spreads the 150 nested windows over about four chunks per thread
+    chunks = []
+    with ThreadPoolExecutor(8) as executor:
+        submit = executor.submit
+        executor.submit = lambda fn, model, fit_args, chunk: chunks.append(len(chunk)) or submit(fn, model, fit_args, chunk)
+        lppls_model.nested_fits(executor, max_searches=1, minimizer='numba', seed=7, granularity='slice')
+    assert chunks == [5] * 30
+    for f in set(a.dtype.names) - {'wall_time'}:
+        assert np.array_equal(a[f], b[f], equal_nan=True)
+        assert np.array_equal(a[f], c[f], equal_nan=True)
+
+def test_nested_fits_cache(observations, lppls_model, tmp_path):
+    cache = fit_cache.FitCache(str(tmp_path / 'fits.sqlite'))
+    a = lppls_model.mp_compute_nested_fits(workers=1, max_searches=3, minimizer='numba', as_array=True, cache=cache)
+    assert len(cache) == 5
+
+    # cached windows come back unchanged without refitting, only the appended window is new
+    extended = lppls.LPPLS(np.hstack([observations, [[100.0, 101.0, 102.0, 103.0, 104.0], [1.0] * 5]]))
+    b = extended.compute_nested_fits(max_searches=3, minimizer='numba', as_array=True, cache=cache)
+    assert len(cache) == 6
+    assert b.shape == (6, 30)
+    for f in a.dtype.names:
+        assert np.array_equal(a[f], b[f][:5], equal_nan=True)
+
+    # a different configuration does not hit the cache
+    lppls_model.compute_nested_fits(max_searches=4, minimizer='numba', as_array=True, cache=cache)
+    assert len(cache) == 11
+
+def test_mp_compute_nested_fits_checkpoint(observations, lppls_model, tmp_path, monkeypatch):
+    path = str(tmp_path / 'sweep.npz')
+    a = lppls_model.mp_compute_nested_fits(workers=1, max_searches=3, minimizer='numba', seed=0, as_array=True, checkpoint=path)
+    with np.load(path) as saved:
+        assert saved['done'].all()
+        key, res, done = saved['key'], saved['res'], saved['done']
+
+    # as if the sweep had been stopped after the first two windows
+    done[2:] = False
+    res[2:] = 0
+    with open(path, 'wb') as fh:
+        np.savez(fh, key=key, res=res, done=done)
+    fitted = []
+    pool_compute = lppls_model._pool_compute_nested_fits
+    monkeypatch.setattr(lppls_model, '_pool_compute_nested_fits', lambda w, starts, *args, **kwargs: fitted.extend(starts) or pool_compute(w, starts, *args, **kwargs))
+    b = lppls_model.mp_compute_nested_fits(workers=1, max_searches=3, minimizer='numba', seed=0, as_array=True, checkpoint=path)
+    assert fitted == [10, 15, 20]
+    for f in set(a.dtype.names) - {'wall_time'}:
+        assert np.array_equal(a[f], b[f], equal_nan=True)
+
+    # another configuration starts over
+    fitted.clear()
+    lppls_model.mp_compute_nested_fits(workers=1, max_searches=4, minimizer='numba', seed=0, as_array=True, checkpoint=path)
+    assert fitted == [0, 5, 10, 15, 20]
+    c = lppls_model.nested_fits(max_searches=4, minimizer='numba', seed=0, checkpoint=path)
+    with np.load(path) as saved:
+        assert np.array_equal(saved['res']['tc'], c['tc'], equal_nan=True)
+
+def test__lppls_residual_jacobian(observations):
+    t, p = np.log(observations[0] + 1), np.log(observations[1])
+    x = np.array([5.0, 0.5, 9.0])
+    ok, jac = lppls._lppls_residual_jacobian(t, p, *x)
+    assert ok
+
+    # central differences of the profiled residuals
+    eps = np.array([1e-6, 1e-7, 1e-6])
+    numeric = np.empty_like(jac)
+    for k in range(3):
+        step = np.eye(3)[k] * eps[k]
+        numeric[:, k] = (lppls._lppls_residuals(t, p, *(x + step))[1] - lppls._lppls_residuals(t, p, *(x - step))[1]) / (2 * eps[k])
+    assert np.allclose(jac, numeric, rtol=1e-4, atol=1e-7)
+
+
+def test_func_restricted_jac(observations, lppls_model):
+    obs = np.array([observations[0], np.log(observations[1])])
+    x = np.array([130.0, 0.5, 9.0])
+    grad = lppls_model.func_restricted_jac(x, obs)
+
+    eps = np.array([1e-6, 1e-8, 1e-7])
+    numeric = np.array([
+        (lppls_model.func_restricted(x + np.eye(3)[k] * eps[k], obs) - lppls_model.func_restricted(x - np.eye(3)[k] * eps[k], obs)) / (2 * eps[k])
+        for k in range(3)
+    ])
+    assert np.allclose(grad, numeric, rtol=1e-4, atol=1e-8)
+
+    tc, m, w, a, b, c, c1, c2 = lppls_model.estimate_params(obs, x, "L-BFGS-B")
+    assert lppls_model.func_restricted([tc, m, w], obs) <= lppls_model.func_restricted(x, obs)
+
+
+def test_fit_grid(observations, lppls_model):
+    obs = np.array([observations[0], np.log(observations[1])])
+    seeds = lppls_model._grid_seeds(obs, (6, 5, 4), 10)
+    assert seeds.shape == (10, 3)
+    costs = [lppls_model.func_restricted(x, obs) for x in seeds]
+    init_limits = lppls_model._get_init_limits(obs)
+    for k, (lo, hi) in enumerate(init_limits):
+        assert np.all((seeds[:, k] >= lo) & (seeds[:, k] <= hi))
+
+    # the best grid point seeds the first search
+    assert costs[0] == min(costs)
+    tc, m, w, a, b, c, c1, c2, O, D = lppls_model.fit(3, obs=obs, grid=(6, 5, 4))
+    assert lppls_model.func_restricted([tc, m, w], obs) <= costs[0]
+    tc, m, w, a, b, c, c1, c2, O, D = lppls_model.fit(3, minimizer="numba", obs=obs, grid=(6, 5, 4))
+    assert lppls_model.func_restricted([tc, m, w], obs) <= costs[0]
+
+
+def test_nested_grid_seeds(observations, lppls_model):
+    obs = np.array([observations[0], np.log(observations[1])])[:, :80]
+    starts = range(0, 60, 20)
+    seeds = lppls_model._nested_grid_seeds(obs, (6, 5, 4), starts, 10)
+    assert len(seeds) == len(starts)
+    for j, s in zip(starts, seeds):
+        assert s.shape == (10, 3)
+        for k, (lo, hi) in enumerate(lppls_model._get_init_limits(obs[:, j:])):
+            assert np.all((s[:, k] >= lo - 1e-9) & (s[:, k] <= hi + 1e-9))
+        costs = [lppls_model.func_restricted(x, obs[:, j:]) for x in s]
+        assert costs[0] == pytest.approx(min(costs))
+
+    # the shared grid is scored like _cost_grid on every nested window
+    axes = [np.linspace(75.0, 90.0, 4), np.linspace(0.1, 1.0, 3), np.linspace(6.0, 13.0, 3)]
+    costs = lppls._nested_cost_grid(obs[0], obs[1], *axes, np.array(starts, dtype=np.int64))
+    for k, j in enumerate(starts):
+        expected = lppls._cost_grid(obs[0, j:], obs[1, j:], *axes)
+        assert np.allclose(costs[k], expected, rtol=1e-6)
+
+    res = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', grid=(6, 5, 4), as_array=True)
+    assert (res['tc'] != 0).any()
+
+
 def test__is_O_in_range(lppls_model):
 
     # Case 1, True
@@ -155,4 +552,83 @@ def test__is_D_in_range(lppls_model):
     b = 1000
     c = 100
     D_min
-    assert lppls_model._is_D_in_range(m, w, b, c, D_min) == False
\ No newline at end of file
+    assert lppls_model._is_D_in_range(m, w, b, c, D_min) == False
+
+def test__nelder_mead(observations, lppls_model):
+    # The compiled Nelder-Mead should retrace scipy's Nelder-Mead on the profiled cost.
+    from scipy.optimize import minimize
+
+    seed = np.array([110.0, 0.5, 9.0])
+    expected = minimize(lppls_model.func_restricted, seed, args=observations, method='Nelder-Mead')
+    x, fun, nfev, success = lppls._nelder_mead(observations[0], observations[1], seed, 600, 1e-4, 1e-4)
+    assert success == expected.success
+    assert nfev == expected.nfev
+    assert np.allclose(x, expected.x)
+    assert fun == pytest.approx(expected.fun)
+
+
+def test_fit_numba(observations, lppls_model):
+    tc, m, w, a, b, c, c1, c2, O, D = lppls_model.fit(5, minimizer='numba')
+    assert lppls_model.coef_['tc'] == tc
+    # the compiled cost must agree with func_restricted at the returned solution
+    assert lppls_model.func_restricted(np.array([tc, m, w]), observations) == pytest.approx(
+        lppls._profile_cost(observations[0], observations[1], tc, m, w))
+
+
+def test_nested_matrix_equation(observations, lppls_model):
+    # The suffix-sum solution must agree with solving each nested slice from scratch.
+    tc, m, w = 110.0, 0.5, 9.0
+    starts = [0, 10, 40, 80]
+    params, cost = lppls_model.nested_matrix_equation(observations, tc, m, w, starts)
+    for k, j in enumerate(starts):
+        expected = lppls_model.matrix_equation(observations[:, j:], tc, m, w)[:, 0]
+        assert np.allclose(params[k], expected, rtol=1e-6)
+        assert cost[k] == pytest.approx(lppls_model.func_restricted(np.array([tc, m, w]), observations[:, j:]), rel=1e-6)
+
+def test_mp_compute_multiscale_fits(observations, lppls_model):
+    scales = [(40, 20), (30, 10)]
+    ends, windows, index = lppls_model._multiscale_windows(100, scales, 10, 5)
+    assert ends == [40, 50, 60, 70, 80, 90, 100]
+    # lengths 25..30 of the smaller scale are shared with the larger one
+    assert len(windows) == 7 * (4 + 4 - 2)
+
+    res = lppls_model.mp_compute_multiscale_fits(
+        workers=1, scales=scales, outer_increment=10, inner_increment=5, max_searches=3, minimizer='numba', seed=0
+    )
+    assert res[40].shape == (7, 4)
+    assert res[30].shape == (7, 4)
+    # same windows as the single scale sweeps, whose outer windows of the smaller scale start one row earlier
+    for (window_size, smallest_window_size), skip in zip(scales, [0, 1]):
+        single = lppls_model.mp_compute_nested_fits(
+            workers=1, window_size=window_size, smallest_window_size=smallest_window_size, outer_increment=10,
+            inner_increment=5, max_searches=1, minimizer='numba', as_array=True,
+        )
+        for f in ['t1', 't2', 'p2']:
+            assert np.array_equal(res[window_size][f], single[f][skip:])
+    # windows shared by both scales are fitted once
+    for f in res[40].dtype.names:
+        assert np.array_equal(res[40][f][:, 2:], res[30][f][:, :2], equal_nan=True)
+
+    res_df = lppls_model.compute_multiscale_indicators(res)
+    assert list(res_df.columns) == ['time', 'price', 'pos_conf_40', 'neg_conf_40', 'pos_conf_30', 'neg_conf_30']
+    assert np.allclose(res_df['pos_conf_30'], lppls_model.compute_indicators(res[30])['pos_conf'])
+
+def test_nb_compute_nested_fits(observations, lppls_model, sibling):
+    obs = np.array([observations[0], np.log(observations[1])])
+    model = lppls.LPPLS(obs)
+    expected = model.compute_nested_fits(max_searches=3, minimizer='numba', seed=0, as_array=True)
+    res = model.nb_compute_nested_fits(max_searches=3, seed=0, threads=1)
+    assert res.shape == expected.shape == (5, 30)
+    # the same seeds, optimizer and linear solve as compute_nested_fits
+    for f in set(res.dtype.names) - {'wall_time'}:
+        assert np.allclose(res[f], expected[f], rtol=1e-12, equal_nan=True), f
+
+    res = model.nb_compute_nested_fits(max_searches=3)
+    assert (res['t1'] == expected['t1']).all()
+    assert set(res['status'].ravel()) <= {0.0, 1.0, 2.0}
+
+    # the kernel fits the quantile loss of QLPPLS, but not the objectives of LPPLS_LM and LPPLSCMAES
+    sibling('lppls_q', 'QLPPLS')(obs).nb_compute_nested_fits(max_searches=1, seed=0)
+    for module, name in [('lppls_lm', 'LPPLS_LM'), ('lppls_cmaes', 'LPPLSCMAES')]:
+        with pytest.raises(AssertionError):
+            sibling(module, name)(obs).nb_compute_nested_fits(max_searches=1)
@@ -0,0 +1,41 @@
+import lppls
+import data_loader
+import numpy as np
+
+
+def chisquare(model, x, obs):
+    # the objective of the original LPPLSCMAES.fun_restricted, the chi-square of the fit against the observations
+    tc, m, w = x
+    a, b, c1, c2 = model.matrix_equation(obs, tc, m, w)[:, 0]
+    res = lppls.LPPLS.lppls(obs[0], tc, m, w, a, b, c1, c2)
+    res[~np.isfinite(res)] = 0.0
+    return np.sum((res - obs[1]) ** 2 / obs[1])
+
+
+def test_fun_restricted_population(sibling):
+    data = data_loader.nasdaq_dotcom().head(100)
+    obs = np.array([np.arange(len(data), dtype=np.float64), np.log(data['Adj Close'].values)])
+    model = sibling('lppls_cmaes', 'LPPLSCMAES')(obs)
+    xs = np.array([[110.0, 0.5, 9.0], [130.0, 0.2, 6.5], [101.0, 0.9, 12.0]])
+    errors = model.fun_restricted_population(xs, obs)
+    assert errors.shape == (3,)
+    for x, error in zip(xs, errors):
+        assert model.fun_restricted(x, obs) == error
+        assert np.isclose(error, chisquare(model, x, obs), rtol=1e-8)
+
+
+def test_fit_quiet(sibling, tmp_path, monkeypatch, capsys):
+    data = data_loader.nasdaq_dotcom().head(100)
+    obs = np.array([np.arange(len(data), dtype=np.float64), np.log(data['Adj Close'].values)])
+    model = sibling('lppls_cmaes', 'LPPLSCMAES')(obs)
+    monkeypatch.chdir(tmp_path)
+    stats = {}
+    model.fit(max_iteration=20, pop_size=1, stats=stats)
+    assert stats['nfev'] > 0
+    # progress output and the outcmaes/ data files are opt-in
+    assert capsys.readouterr().out == ''
+    assert list(tmp_path.iterdir()) == []
+
+    model.fit(max_iteration=2, pop_size=1, verbose=True, log=True)
+    assert capsys.readouterr().out != ''
+    assert (tmp_path / 'outcmaes').is_dir()
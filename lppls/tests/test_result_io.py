@@ -0,0 +1,41 @@
+import lppls
+import data_loader
+import pytest
+import numpy as np
+
+pytest.importorskip('pyarrow')
+import result_io
+
+
+@pytest.fixture
+def lppls_model():
+    data = data_loader.nasdaq_dotcom().head(100)
+    return lppls.LPPLS(np.array([np.arange(len(data), dtype=np.float64), data['Adj Close'].values]))
+
+
+def test_write_nested_fits(lppls_model, tmp_path):
+    path = str(tmp_path / 'fits.parquet')
+    res = lppls_model.compute_nested_fits(max_searches=3, minimizer='numba', seed=0, as_array=True)
+    result_io.write_nested_fits(path, res, row_group_size=60)
+
+    fits = result_io.read_nested_fits(path)
+    assert fits.dtype.names == result_io.INDICATOR_FIELDS
+    assert fits.shape == res.shape
+    for f in fits.dtype.names:
+        assert np.array_equal(fits[f], res[f], equal_nan=True)
+    expected = lppls_model.compute_indicators(res)
+    indicators = lppls_model.compute_indicators(fits)
+    assert np.allclose(indicators[['pos_conf', 'neg_conf']], expected[['pos_conf', 'neg_conf']])
+
+    fits = result_io.read_nested_fits(path, columns=None, windows=(1, 3))
+    assert fits.dtype == res.dtype
+    assert np.array_equal(fits['tc'], res['tc'][1:3], equal_nan=True)
+
+
+def test_nested_fit_writer(lppls_model, tmp_path):
+    path = str(tmp_path / 'fits.parquet')
+    with result_io.NestedFitWriter(path) as writer:
+        res = lppls_model.mp_compute_nested_fits(workers=1, max_searches=3, minimizer='numba', seed=0, as_array=True, writer=writer)
+    fits = result_io.read_nested_fits(path, columns=('tc', 'status'))
+    assert np.array_equal(fits['tc'], res['tc'], equal_nan=True)
+    assert np.array_equal(fits['status'], res['status'])
@@ -22,6 +22,9 @@ setuptools.setup(name='lppls',
           'tqdm',
           'numba'
       ],
+      extras_require={
+          'parquet': ['pyarrow'],
+      },
       zip_safe=False,
       include_package_data=True,
       package_data={'': ['data/*.csv']},